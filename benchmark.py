@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import subprocess
+import datetime as dt
+import numpy as np
+
+from warehouse_env.warehouse import WarehouseEnv
+from warehouse_env.generator import generate_layout, validate_layout, write_layout
+
+BUNDLED_LAYOUTS = ["layout1.yml", "layout2.yml", "layout2-2bins.yml", "layout3.yml"]
+
+# (height, width, bins, bin-slot-size) of the generated layouts
+GENERATED_LAYOUTS = [
+    (10, 10, 12, 2),
+    (20, 20, 60, 4),
+    (40, 40, 300, 4),
+    (60, 60, 700, 4),
+]
+
+
+def _rate(count, seconds):
+    return count / seconds if seconds > 0 else float("inf")
+
+
+def bench_layout(layout_path, steps, seed, render_steps, profile=False):
+    rng = np.random.default_rng(seed)
+
+    start = time.perf_counter()
+    env = WarehouseEnv(layout_path, render_mode="rgb_array", verbose=False)
+    init_time = time.perf_counter() - start
+    env.seed(seed)
+    env.reset(assertions=False)
+    actions = rng.integers(0, env.action_space.n, size=steps)
+
+    start = time.perf_counter()
+    episodes = 0
+    for action in actions:
+        _, _, done, _ = env.step(action)
+        if done:
+            episodes += 1
+            env.reset(assertions=False)
+    step_time = time.perf_counter() - start
+
+    n_resets = max(1, steps // 10)
+    start = time.perf_counter()
+    for _ in range(n_resets):
+        env.reset(assertions=False)
+    reset_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        env._next_state()
+    next_state_time = time.perf_counter() - start
+
+    render_time = 0.0
+    if render_steps > 0:
+        start = time.perf_counter()
+        for action in actions[:render_steps]:
+            _, _, done, _ = env.step(action)
+            if done:
+                env.reset(assertions=False)
+            env.render()
+        render_time = time.perf_counter() - start
+    env.close()
+
+    # tracemalloc slows everything down, so memory is measured in a separate run
+    tracemalloc.start()
+    env = WarehouseEnv(layout_path, verbose=False)
+    env.seed(seed)
+    env.reset(assertions=False)
+    traced_steps = min(steps, 1000)
+    step_allocations = 0
+    for action in actions[:traced_steps]:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        _, _, done, _ = env.step(action)
+        step_allocations += tracemalloc.get_traced_memory()[1] - before
+        if done:
+            env.reset(assertions=False)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    phases = None
+    if profile:
+        # the timing wrappers add overhead, so the phases come from a separate run too
+        env = WarehouseEnv(layout_path, verbose=False, profile=True)
+        env.seed(seed)
+        env.reset(assertions=False)
+        for action in actions:
+            _, _, done, _ = env.step(action)
+            if done:
+                env.reset(assertions=False)
+        phases = env.stats()["phases"]
+
+    return {
+        "layout": os.path.basename(layout_path),
+        "height": env.layout["height"],
+        "width": env.layout["width"],
+        "bins": len(env.bins),
+        "bin_slot_size": env.layout["bin-slot-size"],
+        "observation_bytes": int(np.prod(env.shape)),
+        "init_sec": init_time,
+        "steps_per_sec": _rate(steps, step_time),
+        "episodes": episodes,
+        "resets_per_sec": _rate(n_resets, reset_time),
+        "next_state_per_sec": _rate(steps, next_state_time),
+        "renders_per_sec": _rate(render_steps, render_time) if render_steps else None,
+        # peak of the bytes allocated while a step runs, incl. memory freed again
+        "alloc_bytes_per_step": step_allocations / max(1, traced_steps),
+        "peak_traced_bytes": peak,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "phases": phases,
+    }
+
+
+def _git_commit():
+    try:
+        return (
+            subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL)
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_comparison(results, previous_path):
+    with open(previous_path, "r") as f:
+        previous = {r["layout"]: r for r in json.load(f)["results"]}
+    for r in results:
+        old = previous.get(r["layout"])
+        if old is None:
+            continue
+        print(
+            r["layout"]
+            + ": steps/sec x{:.2f}, resets/sec x{:.2f}".format(
+                r["steps_per_sec"] / old["steps_per_sec"],
+                r["resets_per_sec"] / old["resets_per_sec"],
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WarehouseEnv throughput benchmark")
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--render-steps", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-generated", action="store_true")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--compare", help="results json of an earlier run")
+    parser.add_argument(
+        "--profile", action="store_true", help="time the phases of a step per layout"
+    )
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        layouts = [p for p in BUNDLED_LAYOUTS if os.path.exists(p)]
+        if not args.no_generated:
+            for height, width, n_bins, slot_size in GENERATED_LAYOUTS:
+                path = os.path.join(
+                    tmp, "generated-{}x{}-{}bins-{}slots.yml".format(height, width, n_bins, slot_size)
+                )
+                layout = generate_layout(width, height, n_bins, slot_size)
+                validate_layout(layout)
+                write_layout(layout, path)
+                layouts.append(path)
+
+        for path in layouts:
+            result = bench_layout(
+                path, args.steps, args.seed, args.render_steps, profile=args.profile
+            )
+            results.append(result)
+            print(
+                "{layout}: {steps_per_sec:.0f} steps/sec, {resets_per_sec:.0f} resets/sec, "
+                "{alloc_bytes_per_step:.0f} B/step, peak {peak_traced_bytes} B".format(**result)
+            )
+            if result["phases"]:
+                for phase, timer in result["phases"].items():
+                    print(
+                        "  {}: {} calls, {:.2f} us mean, {:.1f} us max".format(
+                            phase, timer["calls"], timer["mean_us"], timer["max_us"]
+                        )
+                    )
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "commit": _git_commit(),
+                "date": dt.datetime.now().isoformat(),
+                "steps": args.steps,
+                "seed": args.seed,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    if args.compare:
+        _print_comparison(results, args.compare)
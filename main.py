@@ -1,6 +1,5 @@
 import random
 import math
-import time
 import numpy as np
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Dense, Conv2D, Flatten
@@ -103,7 +102,8 @@ if __name__ == "__main__":
 
     print("### TESTING ###")
     agent.training = False
-    env = WarehouseEnv(env_layout)
+    # rendering runs in a background thread, frames are dropped instead of slowing the loop
+    env = WarehouseEnv(env_layout, render_worker="thread", render_fps=5)
     state = env.reset()
 
     steps = []
@@ -119,11 +119,11 @@ if __name__ == "__main__":
                 break
             state = next_state
             env.render()
-            time.sleep(0.2)
             if done:
                 break
         state = env.reset(assertions=False)
         steps.append(i +1)
+    env.close()
         
     # sim.test(max_steps=1000)
 
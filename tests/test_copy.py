@@ -0,0 +1,98 @@
+import os
+import copy
+import pickle
+import numpy as np
+import pytest
+from warehouse_env.warehouse import WarehouseEnv
+from warehouse_env.macro import MacroActionWrapper
+from warehouse_env.oracle import OraclePolicy
+
+LAYOUT = os.path.join(os.path.dirname(os.path.dirname(__file__)), "layout3.yml")
+
+
+def deepcopied(env):
+    return copy.deepcopy(env)
+
+
+def unpickled(env):
+    return pickle.loads(pickle.dumps(env))
+
+
+def _item_steps(env, n_steps=2000, seed=0):
+    # valid random actions until the env has loaded and unloaded an item
+    rng = np.random.default_rng(seed)
+    loads = unloads = 0
+    for _ in range(n_steps):
+        action = rng.choice(np.flatnonzero(env.action_mask()))
+        _, reward, done, _ = env.step(action)
+        assert reward >= 0
+        if action in env.load_actions:
+            loads += 1
+        elif action in env.unload_actions:
+            unloads += 1
+        if done:
+            env.reset(assertions=False)
+        if loads and unloads:
+            break
+    return loads, unloads
+
+
+@pytest.mark.parametrize("profile", [False, True])
+@pytest.mark.parametrize("make_copy", [deepcopied, unpickled])
+def test_copy_loads_and_unloads(make_copy, profile):
+    env = WarehouseEnv(LAYOUT, verbose=False, debug_checks=True, profile=profile)
+    env.seed(0)
+    env.reset(assertions=False)
+    state = env.get_state()
+
+    other = make_copy(env)
+    loads, unloads = _item_steps(other)
+    assert loads > 0 and unloads > 0
+    assert env.get_state() == state
+    if profile:
+        assert other.stats()["steps"] > 0 and env.stats()["steps"] == 0
+
+
+@pytest.mark.parametrize("make_copy", [deepcopied, unpickled])
+def test_copy_macro_actions(make_copy):
+    env = WarehouseEnv(LAYOUT, verbose=False, debug_checks=True)
+    env.seed(0)
+    env.reset(assertions=False)
+    wrapper = MacroActionWrapper(make_copy(env))
+    for _ in range(10):
+        mask = wrapper.action_mask()
+        _, reward, done, info = wrapper.step(np.flatnonzero(mask)[0])
+        assert reward >= 0 and info["steps"] > 0
+        if done:
+            wrapper.reset(assertions=False)
+
+
+@pytest.mark.parametrize("make_copy", [deepcopied, unpickled])
+def test_copy_oracle(make_copy):
+    env = WarehouseEnv(LAYOUT, verbose=False, debug_checks=True)
+    env.seed(0)
+    env.reset(assertions=False)
+    policy = make_copy(OraclePolicy(env))
+    for _ in range(3):
+        done = False
+        while not done:
+            _, reward, done, _ = policy.env.step(policy.act())
+            assert reward >= 0
+        policy.env.reset(assertions=False)
+
+
+@pytest.mark.parametrize("make_copy", [deepcopied, unpickled])
+def test_copy_cprofiled(make_copy):
+    env = WarehouseEnv(LAYOUT, verbose=False)
+    env.enable_profiling(cprofile=True)
+    env.seed(0)
+    env.reset(assertions=False)
+    _item_steps(env, n_steps=20)
+    steps = env.stats()["steps"]
+
+    other = make_copy(env)
+    assert other.stats()["steps"] == steps
+    loads, unloads = _item_steps(other, seed=1)
+    assert loads > 0 and unloads > 0
+    assert other.stats()["steps"] > steps and env.stats()["steps"] == steps
+    assert other.profiler.cprofile_stats().total_calls > 0
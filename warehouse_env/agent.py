@@ -12,20 +12,37 @@ from warehouse_env.bins import StagingIn, StagingOut
 
 
 class Agent:
+    __slots__ = (
+        "agent_pos",
+        "env_height",
+        "env_width",
+        "bin_size",
+        "blocked",
+        "loading_index",
+        "loaded_item",
+        "verbose",
+    )
+
     def __init__(
         self,
         agent_pos,
         env_height: int,
         env_width: int,
         bin_size: int,
-        blocked_positions,
+        blocked,
+        loading_index,
+        verbose=True,
     ):
-        self.agent_pos = agent_pos
+        # (row, col), replaced on every move
+        self.agent_pos = tuple(agent_pos)
         self.env_height = env_height
         self.env_width = env_width
         self.bin_size = bin_size
-        self.blocked_positions = blocked_positions
+        # [height, width] grids of CompiledLayout
+        self.blocked = blocked
+        self.loading_index = loading_index
         self.loaded_item = None
+        self.verbose = verbose
 
     def to_string(self) -> str:
         return (
@@ -39,44 +56,31 @@ class Agent:
             )
         )
 
-    def move(self, action: int) -> float:
+    def move_target(self, action: int):
+        """Cell a move action leads to, None if it leaves the grid or hits a bin"""
+        r, c = self.agent_pos
         if action == MOVE_UP:
-            if (
-                self.agent_pos[0] - 1 < 0
-                or [self.agent_pos[0] - 1, self.agent_pos[1]] in self.blocked_positions
-            ):
-                return INVALID_ACTION
-            else:
-                self.agent_pos[0] -= 1
+            r -= 1
         elif action == MOVE_DOWN:
-            if (
-                self.agent_pos[0] + 1 >= self.env_height
-                or [self.agent_pos[0] + 1, self.agent_pos[1]] in self.blocked_positions
-            ):
-                return INVALID_ACTION
-            else:
-                self.agent_pos[0] += 1
+            r += 1
         elif action == MOVE_LEFT:
-            if (
-                self.agent_pos[1] - 1 < 0
-                or [self.agent_pos[0], self.agent_pos[1] - 1] in self.blocked_positions
-            ):
-                return INVALID_ACTION
-            else:
-                self.agent_pos[1] -= 1
+            c -= 1
         elif action == MOVE_RIGHT:
-            if (
-                self.agent_pos[1] + 1 >= self.env_width
-                or [self.agent_pos[0], self.agent_pos[1] + 1] in self.blocked_positions
-            ):
-                return INVALID_ACTION
-            else:
-                self.agent_pos[1] += 1
+            c += 1
         else:
-            # TODO check obstacles!!!!
             raise AssertionError("Invalid action Type.")
 
-        assert self.agent_pos not in self.blocked_positions
+        if r < 0 or r >= self.env_height or c < 0 or c >= self.env_width:
+            return None
+        if self.blocked[r, c]:
+            return None
+        return r, c
+
+    def move(self, action: int) -> float:
+        target = self.move_target(action)
+        if target is None:
+            return INVALID_ACTION
+        self.agent_pos = target
         return 0.0
 
     def load_item(
@@ -85,9 +89,11 @@ class Agent:
         # check if agent has capacity
         if self.loaded_item is not None:
             return INVALID_ACTION
+        index = self.loading_index[self.agent_pos]
         # check for bins
-        for b in bins:
-            if self.agent_pos in b.loading_positions and slot in b.get_slots():
+        if 0 <= index < len(bins):
+            b = bins[index]
+            if slot in b.get_slots():
                 self.loaded_item = b.remove_item(slot)
                 if (
                     staging_out.pick_transaction is not None and
@@ -95,20 +101,19 @@ class Agent:
                     and not self.loaded_item.had_first_remove_from_bin_reward
                 ):
                     # loaded item that is in pick_transaction
-                    print("Item removed first time from Bin")
+                    if self.verbose:
+                        print("Item removed first time from Bin")
                     self.loaded_item.had_first_remove_from_bin_reward = True
                     return 0.0 # GOOD_ACTION - GOOD_ACTION here will result in more instable training
                 else:
                     # just loaded item of unrelated bin
                     return 0.0
 
-        if (
-            self.agent_pos in staging_in.loading_positions
-            and slot in staging_in.get_used_slot_ids()
-        ):
+        if index == len(bins) and slot in staging_in.get_used_slot_ids():
             # Item picked up from Staging Area
             self.loaded_item = staging_in.remove_item(slot)
-            print("Item from Staging In")
+            if self.verbose:
+                print("Item from Staging In")
             return GOOD_ACTION
 
         return INVALID_ACTION
@@ -119,10 +124,12 @@ class Agent:
         # check if agent has item to put
         if self.loaded_item is None:
             return INVALID_ACTION
+        index = self.loading_index[self.agent_pos]
 
         # check for bins
-        for b in bins:
-            if self.agent_pos in b.loading_positions and slot == self.loaded_item.slot:
+        if 0 <= index < len(bins):
+            b = bins[index]
+            if slot == self.loaded_item.slot and b.has_capacity():
                 b.place_item(self.loaded_item, slot)
                 if (
                     staging_in.put_transaction is not None
@@ -131,7 +138,8 @@ class Agent:
                 ):
                     # delivered item that was in put transaction
                     self.loaded_item.had_first_place_in_bin_reward = True
-                    print("Item placed first time to Bin")
+                    if self.verbose:
+                        print("Item placed first time to Bin")
                     self.loaded_item = None
                     return GOOD_ACTION
                 else:
@@ -140,13 +148,15 @@ class Agent:
                     return 0.0
 
         if (
-            self.agent_pos in staging_out.loading_positions
+            index == len(bins) + 1
+            and slot == self.loaded_item.slot
             and slot in staging_out.incoming
         ):
             # At Staging and item is in transaction
             staging_out.place_item(self.loaded_item, slot)
             self.loaded_item = None
-            print("Item to Staging Out")
+            if self.verbose:
+                print("Item to Staging Out")
             return GOOD_ACTION
 
         return INVALID_ACTION
@@ -1,23 +1,40 @@
 import random
 import copy
-import itertools
+from collections import deque
 from warehouse_env.item import Item
+from warehouse_env.inventory import Inventory
 from warehouse_env.helpers import print_position
 from warehouse_env.transaction import PickTransaction, PutTransaction
 from warehouse_env.constants import PICK_T, PUT_T
 
 
 class Bin:
-    def __init__(self, pos, loading_positions):
-        self.pos = pos
-        self.loading_positions = loading_positions
+    __slots__ = ("pos", "loading_positions", "inventory", "capacity", "_slots")
+
+    def __init__(
+        self, pos, loading_positions, inventory: Inventory = None, capacity=None
+    ):
+        # positions are (row, col) tuples
+        self.pos = tuple(pos)
+        self.loading_positions = tuple(tuple(p) for p in loading_positions)
+        self.inventory = inventory
+        # number of items the bin can hold, None for no limit
+        self.capacity = capacity
         self._slots = {}
 
+    def has_capacity(self) -> bool:
+        return self.capacity is None or len(self._slots) < self.capacity
+
     def place_item(self, item: Item, slot: int):
         assert item.slot == slot
+        assert self.has_capacity(), "Bin at " + print_position(self.pos) + " is full"
         self._slots[slot] = item
+        if self.inventory is not None:
+            self.inventory.store(slot, self)
 
     def remove_item(self, slot: int) -> Item:
+        if self.inventory is not None:
+            self.inventory.release(slot)
         return self._slots.pop(slot)
 
     def get_slots(self):
@@ -43,9 +60,13 @@ class Bin:
 
 
 class StagingIn(Bin):
+    __slots__ = ("put_transaction", "pending")
+
     def __init__(self, pos, loading_positions):
         super().__init__(pos, loading_positions)
         self.put_transaction = None
+        # put transactions waiting for this one, only used in continuous operation
+        self.pending = deque()
 
     def apply_put(self, put_transaction: PutTransaction):
         assert put_transaction.get_type() == PUT_T
@@ -54,12 +75,9 @@ class StagingIn(Bin):
             self.get_slots()[item.slot] = item
         self.put_transaction = put_transaction
 
-    def is_current_transaction_done(self, bins):
-        used_slots = [
-            x for x in itertools.chain.from_iterable(b.get_used_slot_ids() for b in bins)
-        ]
+    def is_current_transaction_done(self, inventory: Inventory):
         for item in self.put_transaction.items:
-            if item.slot not in used_slots:
+            if not inventory.is_stored(item.slot):
                 return False
         return True
 
@@ -80,10 +98,14 @@ class StagingIn(Bin):
 
 
 class StagingOut(Bin):
+    __slots__ = ("pick_transaction", "incoming", "pending")
+
     def __init__(self, pos, loading_positions):
         super().__init__(pos, loading_positions)
         self.pick_transaction = None
         self.incoming = []
+        # pick transactions waiting for this one, only used in continuous operation
+        self.pending = deque()
 
     def get_slots(self):
         raise NotImplementedError("This Method is not allowed for StagingOut")
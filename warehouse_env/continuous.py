@@ -0,0 +1,192 @@
+from warehouse_env.warehouse import WarehouseEnv
+from warehouse_env.inventory import Inventory
+from warehouse_env.constants import PICK_T
+
+
+class ContinuousWarehouseEnv(WarehouseEnv):
+    """WarehouseEnv in continuous operation: orders keep coming in and an episode
+    runs for `horizon` steps.
+
+    Every `order_interval` steps the transaction source adds an order to the
+    pending queue of staging in (puts) or staging out (picks). Each staging area
+    works on one transaction at a time and takes the next one from its queue once
+    it is done, so a put and a pick can be open at the same time. With
+    max_backlog set, orders beyond that many pending ones are rejected. An order
+    that arrives while no id is free to order is starved, so every arrival counts
+    as an order, a rejected or a starved one in kpis().
+
+    Orders are drawn against the ids that are free to order: a pick only asks for
+    stored items no other pick asks for, a put only for ids that are neither in
+    the warehouse nor in another put. info holds the backlog and the items done
+    so far, kpis() the throughput of the episode. get_state/set_state are not
+    supported in this mode.
+    """
+
+    def __init__(
+        self,
+        layout_path="layout.yml",
+        horizon=1000,
+        order_interval=20,
+        max_backlog=None,
+        **kwargs
+    ):
+        self.horizon = horizon
+        self.order_interval = order_interval
+        self.max_backlog = max_backlog
+        super(ContinuousWarehouseEnv, self).__init__(layout_path, **kwargs)
+        # used ids can be picked, free ids put, ids of pending orders are held
+        self._orderable = Inventory(self.max_items_in_env)
+        self._reset_kpis()
+
+    def reset(self, assertions=False, return_info=False):
+        # an episode ends at the horizon, so open orders and carried items are dropped
+        if self.verbose:
+            print("Reset called - Invalid Actions: " + str(self.invalid_action_counter))
+        self.invalid_action_counter = 0
+        for agent in self.agents:
+            agent.loaded_item = None
+        self.staging_in._slots = {}
+        self.staging_in.put_transaction = None
+        self.staging_in.pending.clear()
+        self.staging_out.incoming = []
+        self.staging_out.pick_transaction = None
+        self.staging_out.pending.clear()
+        self.transaction = None
+        self._put_slots = set()
+
+        self._orderable = Inventory(self.max_items_in_env)
+        for slot in self.inventory.used_slot_ids():
+            self._orderable.store(slot, True)
+        self._reset_kpis()
+        self._order()
+
+        self._set_state(self._build_state())
+        if return_info:
+            return self._next_state(), {"action_mask": self.action_mask()}
+        return self._next_state()
+
+    def _info(self, done):
+        info = super(ContinuousWarehouseEnv, self)._info(done)
+        info["backlog"] = self.backlog()
+        info["items"] = self._done_items
+        if done:
+            info["kpis"] = self.kpis()
+        return info
+
+    def get_state(self, full=True):
+        raise AssertionError("Snapshots are not supported in continuous operation")
+
+    def set_state(self, state, observe=True):
+        raise AssertionError("Snapshots are not supported in continuous operation")
+
+    def backlog(self) -> int:
+        # orders that wait in a queue, the open put and pick are not counted
+        return len(self.staging_in.pending) + len(self.staging_out.pending)
+
+    def kpis(self):
+        steps = max(1, self._steps)
+        return {
+            "steps": self._steps,
+            "items": self._done_items,
+            "items_per_1000_steps": 1000.0 * self._done_items / steps,
+            "orders": self._orders,
+            "completed_orders": self._completed_orders,
+            "rejected_orders": self._rejected_orders,
+            "starved_orders": self._starved_orders,
+            "mean_order_steps": self._order_steps / max(1, self._completed_orders),
+            "backlog": self.backlog(),
+            "mean_backlog": self._backlog_sum / steps,
+            "max_backlog": self._max_backlog,
+        }
+
+    def _reset_kpis(self):
+        self._steps = 0
+        self._done_items = 0
+        self._orders = 0
+        self._completed_orders = 0
+        self._rejected_orders = 0
+        self._starved_orders = 0
+        self._order_steps = 0
+        self._backlog_sum = 0
+        self._max_backlog = 0
+
+    def _is_episode_done(self):
+        # called once per step after the action, advances the order queues
+        self._steps += 1
+        put = self.staging_in.put_transaction
+        if put is not None and self.staging_in.is_current_transaction_done(self.inventory):
+            for item in put.items:
+                self._orderable.store(item.slot, True)
+            self._complete(put, len(put.items))
+            self._next_put()
+        pick = self.staging_out.pick_transaction
+        if pick is not None and self.staging_out.is_current_transaction_done():
+            for slot in pick.slot_ids:
+                self._orderable.release(slot)
+            self._complete(pick, len(pick.slot_ids))
+            self._next_pick()
+
+        if self._steps % self.order_interval == 0:
+            self._order()
+        backlog = self.backlog()
+        self._backlog_sum += backlog
+        self._max_backlog = max(self._max_backlog, backlog)
+        return self._steps >= self.horizon
+
+    def _complete(self, transaction, n_items):
+        self._done_items += n_items
+        self.item_counter += n_items
+        self._completed_orders += 1
+        self._order_steps += self._steps - transaction.arrival_step
+
+    def _order(self):
+        if self.max_backlog is not None and self.backlog() >= self.max_backlog:
+            self._rejected_orders += 1
+            return
+        if self._orderable.count_used() == 0 and self._orderable.count_free() == 0:
+            # every id is already asked for by a pending order
+            self._starved_orders += 1
+            return
+        if self._profiler is None:
+            transaction = self.transaction_source.next(self._orderable)
+        else:
+            transaction = self._profiler.call(
+                "transaction", self.transaction_source.next, self._orderable
+            )
+        transaction.arrival_step = self._steps
+        self._orders += 1
+        if transaction.get_type() == PICK_T:
+            for slot in transaction.slot_ids:
+                self._orderable.hold(slot)
+            self.staging_out.pending.append(transaction)
+            if self.staging_out.pick_transaction is None:
+                self._next_pick()
+        else:
+            for item in transaction.items:
+                self._orderable.hold(item.slot)
+            self.staging_in.pending.append(transaction)
+            if self.staging_in.put_transaction is None:
+                self._next_put()
+
+    def _next_put(self):
+        old = self._put_slots
+        self.staging_in.put_transaction = None
+        self._put_slots = set()
+        if self.staging_in.pending:
+            self.transaction = self.staging_in.pending.popleft()
+            self.staging_in.apply_put(self.transaction)
+            self._put_slots = {item.slot for item in self.transaction.items}
+            for slot in self._put_slots:
+                self._patch_slot(self.staging_in, slot)
+        # put items are marked at every bin
+        for slot in old ^ self._put_slots:
+            for b in self.bins:
+                self._patch_slot(b, slot)
+
+    def _next_pick(self):
+        self.staging_out.pick_transaction = None
+        if self.staging_out.pending:
+            self.transaction = self.staging_out.pending.popleft()
+            self.staging_out.apply_pick(self.transaction)
+            for slot in self.transaction.slot_ids:
+                self._patch_slot(self.staging_out, slot)
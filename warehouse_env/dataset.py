@@ -0,0 +1,210 @@
+import os
+import json
+import argparse
+import multiprocessing
+import numpy as np
+from warehouse_env.layout import CompiledLayout, compile_layout
+from warehouse_env.encoding import expand_entities
+
+INDEX_FILE = "index.json"
+SHARD_DIR = "shard_{:05d}"
+ENTITIES_FILE = "entities.raw"
+STEPS_FILE = "steps.raw"
+# offset and count locate the entity rows of the step's observation in ENTITIES_FILE
+STEP_DTYPE = np.dtype(
+    [
+        ("action", np.int32),
+        ("reward", np.float32),
+        ("done", np.bool_),
+        ("episode", np.int32),
+        ("offset", np.int64),
+        ("count", np.int32),
+    ]
+)
+FLUSH_STEPS = 4096
+
+
+def entity_dtype(layout: CompiledLayout):
+    # rows, columns and channels all fit into int16 for any layout that fits into memory
+    largest = max(layout.height, layout.width, layout.n_channels)
+    return np.dtype(np.int16 if largest < 2 ** 15 else np.int32)
+
+
+def _write_shard(task):
+    # runs in a pool worker, the env and policy are created there
+    from warehouse_env.warehouse import WarehouseEnv
+    from warehouse_env.oracle import OraclePolicy
+
+    layout_path, path, seed, min_steps = task
+    env = WarehouseEnv(layout_path, verbose=False, observation_mode="entities")
+    env.seed(seed)
+    policy = OraclePolicy(env)
+    dtype = entity_dtype(env.compiled_layout)
+
+    os.makedirs(path, exist_ok=True)
+    steps = np.zeros(FLUSH_STEPS, dtype=STEP_DTYPE)
+    rows = []
+    count = n_steps = n_rows = episode = 0
+    with open(os.path.join(path, ENTITIES_FILE), "wb") as entities_file, open(
+        os.path.join(path, STEPS_FILE), "wb"
+    ) as steps_file:
+
+        def flush():
+            entities_file.write(np.concatenate(rows).tobytes())
+            steps_file.write(steps[:count].tobytes())
+            rows.clear()
+
+        # whole episodes only, so a shard may get a few more steps than min_steps
+        while n_steps < min_steps:
+            observation = env.reset()
+            done = False
+            while not done:
+                action = policy.act(observation)
+                # entity rows are front packed, the ENTITY_NONE padding is dropped
+                entities = observation[: np.count_nonzero(observation[:, 0])]
+                observation, reward, done, _ = env.step(action)
+                steps[count] = (action, reward, done, episode, n_rows, len(entities))
+                rows.append(entities.astype(dtype))
+                count += 1
+                n_steps += 1
+                n_rows += len(entities)
+                if count == FLUSH_STEPS:
+                    flush()
+                    count = 0
+            episode += 1
+        if count > 0:
+            flush()
+
+    return {
+        "path": os.path.basename(path),
+        "seed": seed,
+        "steps": n_steps,
+        "rows": n_rows,
+        "episodes": episode,
+    }
+
+
+def generate_dataset(layout_path, path, steps, shard_steps=100000, workers=None, seed=0):
+    """Writes at least `steps` OraclePolicy transitions to sharded raw files in a directory.
+
+    Every shard is generated by its own env seeded with seed + shard number, in a
+    process pool of `workers` processes (all cpus for None, no pool for 1).
+    A transition is the observation the policy acted on, its action, the reward
+    and done. Observations are stored as their entity rows (see encoding), that
+    is only what differs from the static layout planes.
+    """
+    # compile once here, the workers then load the layout and the distances from the cache
+    from warehouse_env.paths import distance_table
+
+    compiled = compile_layout(layout_path)
+    distance_table(compiled)
+
+    os.makedirs(path, exist_ok=True)
+    n_shards = max(1, -(-steps // shard_steps))
+    tasks = [
+        (
+            layout_path,
+            os.path.join(path, SHARD_DIR.format(i)),
+            seed + i,
+            min(shard_steps, steps - i * shard_steps),
+        )
+        for i in range(n_shards)
+    ]
+    if workers == 1:
+        shards = [_write_shard(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            shards = pool.map(_write_shard, tasks)
+
+    index = {
+        "layout": compiled.layout,
+        "entity_dtype": entity_dtype(compiled).str,
+        "steps": sum(shard["steps"] for shard in shards),
+        "shards": shards,
+    }
+    with open(os.path.join(path, INDEX_FILE), "w") as f:
+        json.dump(index, f)
+    return ExpertDataset(path)
+
+
+class ExpertDataset:
+    """Read access to a directory written by generate_dataset, all shards are memory mapped"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), "r") as f:
+            self.index = json.load(f)
+        self.layout = CompiledLayout(self.index["layout"])
+        dtype = np.dtype(self.index["entity_dtype"])
+
+        self._steps = []
+        self._entities = []
+        for shard in self.index["shards"]:
+            shard_path = os.path.join(path, shard["path"])
+            self._steps.append(
+                np.memmap(
+                    os.path.join(shard_path, STEPS_FILE),
+                    dtype=STEP_DTYPE,
+                    mode="r",
+                    shape=(shard["steps"],),
+                )
+            )
+            self._entities.append(
+                np.memmap(
+                    os.path.join(shard_path, ENTITIES_FILE),
+                    dtype=dtype,
+                    mode="r",
+                    shape=(shard["rows"], 4),
+                )
+            )
+        self._starts = np.cumsum([0] + [shard["steps"] for shard in self.index["shards"]])
+
+    def __len__(self):
+        return int(self._starts[-1])
+
+    def __getitem__(self, i):
+        """(observation tensor, action, reward, done) of transition i"""
+        _, step = self._locate(i)
+        return (
+            self.observation(i),
+            int(step["action"]),
+            float(step["reward"]),
+            bool(step["done"]),
+        )
+
+    def entities(self, i):
+        shard, step = self._locate(i)
+        return self._entities[shard][step["offset"] : step["offset"] + step["count"]]
+
+    def observation(self, i):
+        return expand_entities(np.asarray(self.entities(i)), self.layout)
+
+    def steps(self):
+        # actions, rewards, dones etc. of all transitions in one array
+        return np.concatenate(self._steps)
+
+    def _locate(self, i):
+        assert 0 <= i < len(self), "Transition " + str(i) + " out of range"
+        shard = np.searchsorted(self._starts, i, side="right") - 1
+        return shard, self._steps[shard][i - self._starts[shard]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate an expert demonstration dataset")
+    parser.add_argument("layout")
+    parser.add_argument("output")
+    parser.add_argument("--steps", type=int, default=1000000)
+    parser.add_argument("--shard-steps", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    dataset = generate_dataset(
+        args.layout,
+        args.output,
+        args.steps,
+        shard_steps=args.shard_steps,
+        workers=args.workers,
+        seed=args.seed,
+    )
+    print("{} transitions in {} shards".format(len(dataset), len(dataset.index["shards"])))
@@ -0,0 +1,134 @@
+"""
+Compact alternatives to the [height, width, 3 + 2 * max_items_in_env] observation tensor.
+
+- tensor: the observation built by WarehouseEnv._next_state
+- packed: the tensor as bits, positive and negative values packed separately
+  along the channel axis, [height, width, 2 * ceil(channels / 8)] uint8
+- entities: one (kind, row, col, slot) row per agent, carried item, stored item
+  and transaction item, padded with ENTITY_NONE rows. Positions of stored and
+  transaction items are the position of their bin or staging area. Blocked
+  cells are not listed, they are part of the layout, and full bins follow from
+  the number of stored items of a bin.
+"""
+import numpy as np
+from gym import spaces
+
+OBSERVATION_MODES = ["tensor", "packed", "entities"]
+
+ENTITY_NONE = 0
+ENTITY_AGENT = 1
+ENTITY_CARRIED = 2
+ENTITY_STORED = 3
+# item of the put transaction, marked -1 at the loading positions of every bin
+ENTITY_PUT = 4
+# item of the pick transaction, marked -1 at the staging out loading positions
+ENTITY_PICK = 5
+
+
+def max_entities(layout, n_agents=1) -> int:
+    # agents, carried items, every slot id once, both transactions
+    return 2 * n_agents + layout.max_items_in_env + 2 * layout.bin_slot_size
+
+
+def observation_space(mode, layout, n_agents=1):
+    shape = (layout.height, layout.width, layout.n_channels)
+    if mode == "tensor":
+        return spaces.Box(low=-1, high=1, shape=shape, dtype=np.uint8)
+    if mode == "packed":
+        packed = (shape[0], shape[1], 2 * ((shape[2] + 7) // 8))
+        return spaces.Box(low=0, high=255, shape=packed, dtype=np.uint8)
+    if mode == "entities":
+        high = max(layout.height, layout.width, layout.max_items_in_env + 1, ENTITY_PICK)
+        return spaces.Box(
+            low=-1, high=high, shape=(max_entities(layout, n_agents), 4), dtype=np.int32
+        )
+    raise AssertionError("Unknown observation mode " + str(mode))
+
+
+def encode_packed(state):
+    return np.concatenate(
+        [np.packbits(state > 0, axis=-1), np.packbits(state < 0, axis=-1)], axis=-1
+    )
+
+
+def write_packed(packed, pos, channel, value):
+    # same as packing the tensor again after state[pos[0], pos[1], channel] = value
+    byte, bit = channel >> 3, 0x80 >> (channel & 7)
+    half = packed.shape[-1] // 2
+    cell = packed[pos[0], pos[1]]
+    negative = half + byte
+    cell[byte] = (cell[byte] | bit) if value > 0 else (cell[byte] & ~bit)
+    cell[negative] = (cell[negative] | bit) if value < 0 else (cell[negative] & ~bit)
+
+
+def expand_packed(packed, n_channels):
+    half = packed.shape[-1] // 2
+    positive = np.unpackbits(packed[..., :half], axis=-1, count=n_channels)
+    negative = np.unpackbits(packed[..., half:], axis=-1, count=n_channels)
+    return positive.astype(np.int8) - negative.astype(np.int8)
+
+
+def encode_entities(agents, bins, staging_in, staging_out, layout):
+    rows = [(ENTITY_AGENT, agent.agent_pos[0], agent.agent_pos[1], 0) for agent in agents]
+    for agent in agents:
+        if agent.loaded_item is not None:
+            rows.append(
+                (ENTITY_CARRIED, agent.agent_pos[0], agent.agent_pos[1], agent.loaded_item.slot)
+            )
+    for b in bins + [staging_in]:
+        for slot in b.get_used_slot_ids():
+            rows.append((ENTITY_STORED, b.pos[0], b.pos[1], slot))
+    if staging_in.put_transaction is not None:
+        for item in staging_in.put_transaction.items:
+            rows.append((ENTITY_PUT, staging_in.pos[0], staging_in.pos[1], item.slot))
+    for slot in staging_out.incoming:
+        rows.append((ENTITY_PICK, staging_out.pos[0], staging_out.pos[1], slot))
+
+    entities = np.zeros((max_entities(layout, len(agents)), 4), dtype=np.int32)
+    entities[: len(rows)] = rows
+    return entities
+
+
+def expand_entities(entities, layout):
+    m = layout.max_items_in_env
+    state = np.array(layout.static_state)
+    containers = {tuple(pos): i for i, pos in enumerate(layout.container_positions)}
+    bin_cells = layout.loading_cells[layout.loading_cells[:, 2] < layout.n_bins, :2]
+
+    # same order as WarehouseEnv._build_state, put markers overwrite stored items
+    for kind in (ENTITY_AGENT, ENTITY_CARRIED, ENTITY_STORED, ENTITY_PUT, ENTITY_PICK):
+        for _, r, c, slot in entities[entities[:, 0] == kind]:
+            if kind == ENTITY_AGENT:
+                state[r, c, 1] = 1
+            elif kind == ENTITY_CARRIED:
+                state[r, c, 1 + slot] = 1
+            elif kind == ENTITY_STORED:
+                cells = layout.container_cells(containers[(r, c)])
+                state[cells[:, 0], cells[:, 1], m + 1 + slot] = 1
+            elif kind == ENTITY_PUT:
+                state[bin_cells[:, 0], bin_cells[:, 1], m + 1 + slot] = -1
+            else:
+                cells = layout.container_cells(layout.staging_out)
+                state[cells[:, 0], cells[:, 1], m + 1 + slot] = -1
+
+    stored = entities[entities[:, 0] == ENTITY_STORED]
+    counts = {}
+    for _, r, c, _ in stored:
+        counts[(r, c)] = counts.get((r, c), 0) + 1
+    for pos, count in counts.items():
+        index = containers[pos]
+        if index < layout.n_bins and count >= layout.bin_slot_size:
+            cells = layout.container_cells(index)
+            state[cells[:, 0], cells[:, 1], layout.full_channel] = 1
+    return state
+
+
+def expand_observation(observation, mode, layout):
+    """The observation tensor of an observation in any of the OBSERVATION_MODES"""
+    if mode == "tensor":
+        return observation
+    if mode == "packed":
+        return expand_packed(observation, layout.n_channels)
+    if mode == "entities":
+        return expand_entities(observation, layout)
+    raise AssertionError("Unknown observation mode " + str(mode))
@@ -0,0 +1,238 @@
+import traceback
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from warehouse_env.warehouse import WarehouseEnv
+
+
+def _attach(shm, shape, dtype):
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _worker(conn, buffers, start, env_class, layout_path, env_kwargs, seeds):
+    # steps envs start, start + 1, ... and writes their results into the shared arrays
+    arrays = {name: _attach(*spec) for name, spec in buffers.items()}
+    actions, observations = arrays["actions"], arrays["observations"]
+    rewards, dones, masks = arrays["rewards"], arrays["dones"], arrays["masks"]
+    terminal = arrays["terminal_observations"]
+    envs = [env_class(layout_path, **env_kwargs) for _ in seeds]
+    for env, seed in zip(envs, seeds):
+        env.seed(seed)
+
+    try:
+        while True:
+            command, arg = conn.recv()
+            try:
+                if command == "step":
+                    extras = []
+                    for i, env in enumerate(envs):
+                        j = start + i
+                        observation, reward, done, info = env.step(actions[j])
+                        mask = info.pop("action_mask")
+                        if done:
+                            terminal[j] = observation
+                            observation, reset_info = env.reset(
+                                assertions=False, return_info=True
+                            )
+                            mask = reset_info["action_mask"]
+                        observations[j] = observation
+                        rewards[j] = reward
+                        dones[j] = done
+                        masks[j] = mask
+                        if info:
+                            extras.append((j, info))
+                    conn.send(("ok", extras))
+                elif command == "reset":
+                    for i, env in enumerate(envs):
+                        observation, info = env.reset(assertions=False, return_info=True)
+                        observations[start + i] = observation
+                        masks[start + i] = info["action_mask"]
+                    conn.send(("ok", None))
+                elif command == "seed":
+                    for env, seed in zip(envs, arg[start : start + len(envs)]):
+                        env.seed(seed)
+                    conn.send(("ok", None))
+                elif command == "close":
+                    conn.send(("ok", None))
+                    break
+                else:
+                    raise AssertionError("Unknown command " + str(command))
+            except Exception:
+                conn.send(("error", traceback.format_exc()))
+    finally:
+        for env in envs:
+            env.close()
+        conn.close()
+
+
+class SharedMemoryEnvPool:
+    """num_envs environments of one layout stepped in worker processes.
+
+    Every worker owns envs_per_worker environments and writes their observations,
+    rewards, dones and action masks straight into shared memory arrays, only a
+    command and the non-empty infos go through its pipe. step_async hands the
+    actions to the workers and returns at once, so the learner can compute while
+    they simulate, step_wait collects the results. Finished environments are reset
+    automatically, info["terminal_observation"] holds their last observation.
+
+    env_class is WarehouseEnv or a subclass, created with env_kwargs in the
+    workers. Env i is seeded from spawned child i of np.random.SeedSequence(seed).
+    step_wait and reset return copies of the shared arrays, with copy=False the
+    arrays themselves, which the next step overwrites.
+    """
+
+    def __init__(
+        self,
+        layout_path,
+        num_envs,
+        envs_per_worker=1,
+        env_class=WarehouseEnv,
+        env_kwargs=None,
+        seed=None,
+        copy=True,
+        start_method=None,
+    ):
+        self.num_envs = num_envs
+        self.envs_per_worker = envs_per_worker
+        self.copy = copy
+        env_kwargs = dict(env_kwargs or {})
+        env_kwargs.setdefault("verbose", False)
+
+        # shapes and dtypes come from one env in this process
+        probe = env_class(layout_path, **env_kwargs)
+        observation, info = probe.reset(return_info=True)
+        self.observation_space = probe.observation_space
+        self.action_space = probe.action_space
+        probe.close()
+
+        specs = {
+            "actions": ((num_envs,) + self.action_space.shape, np.int64),
+            "observations": ((num_envs,) + observation.shape, observation.dtype),
+            "terminal_observations": ((num_envs,) + observation.shape, observation.dtype),
+            "rewards": ((num_envs,), np.float32),
+            "dones": ((num_envs,), np.bool_),
+            "masks": ((num_envs,) + info["action_mask"].shape, np.bool_),
+        }
+        self._shms = []
+        buffers = {}
+        arrays = {}
+        for name, (shape, dtype) in specs.items():
+            size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            shm = shared_memory.SharedMemory(create=True, size=size)
+            self._shms.append(shm)
+            buffers[name] = (shm, shape, dtype)
+            arrays[name] = _attach(shm, shape, dtype)
+        self._actions = arrays["actions"]
+        self._observations = arrays["observations"]
+        self._terminal = arrays["terminal_observations"]
+        self._rewards = arrays["rewards"]
+        self._dones = arrays["dones"]
+        self._masks = arrays["masks"]
+
+        seeds = np.random.SeedSequence(seed).spawn(num_envs)
+        context = multiprocessing.get_context(start_method)
+        self._conns = []
+        self._workers = []
+        for start in range(0, num_envs, envs_per_worker):
+            parent, child = context.Pipe()
+            worker = context.Process(
+                target=_worker,
+                args=(
+                    child,
+                    buffers,
+                    start,
+                    env_class,
+                    layout_path,
+                    env_kwargs,
+                    seeds[start : start + envs_per_worker],
+                ),
+                daemon=True,
+            )
+            worker.start()
+            child.close()
+            self._conns.append(parent)
+            self._workers.append(worker)
+        self.waiting = False
+        self.closed = False
+
+    def reset(self, return_info=False):
+        self._call("reset")
+        observations = self._output(self._observations)
+        if return_info:
+            return observations, [{"action_mask": mask} for mask in self.action_masks()]
+        return observations
+
+    def step_async(self, actions):
+        assert not self.waiting, "step_async called twice without step_wait"
+        self._actions[:] = np.asarray(actions).reshape(self._actions.shape)
+        for conn in self._conns:
+            conn.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        assert self.waiting, "step_wait called without step_async"
+        self.waiting = False
+        results = self._receive()
+        infos = [{"action_mask": mask} for mask in self.action_masks()]
+        for extras in results:
+            for j, info in extras:
+                infos[j].update(info)
+        for j in np.nonzero(self._dones)[0]:
+            infos[j]["terminal_observation"] = self._terminal[j].copy()
+        return (
+            self._output(self._observations),
+            self._output(self._rewards),
+            self._output(self._dones),
+            infos,
+        )
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def action_masks(self):
+        return self._output(self._masks)
+
+    def seed(self, seed=None):
+        seeds = np.random.SeedSequence(seed).spawn(self.num_envs)
+        self._call("seed", seeds)
+        return seeds
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            self._receive()
+            self.waiting = False
+        self._call("close")
+        for worker in self._workers:
+            worker.join()
+        # drop the array views before the memory they point into
+        self._actions = self._observations = self._terminal = None
+        self._rewards = self._dones = self._masks = None
+        for shm in self._shms:
+            shm.close()
+            shm.unlink()
+        self.closed = True
+
+    def _call(self, command, arg=None):
+        assert not self.waiting, "Waiting for step_wait"
+        for conn in self._conns:
+            conn.send((command, arg))
+        return self._receive()
+
+    def _receive(self):
+        # every worker answers, read all answers before raising so the pipes stay in sync
+        results = []
+        errors = []
+        for conn in self._conns:
+            status, result = conn.recv()
+            if status == "error":
+                errors.append(result)
+            results.append(result)
+        if errors:
+            raise AssertionError("Worker failed:\n" + errors[0])
+        return results
+
+    def _output(self, array):
+        return array.copy() if self.copy else array
@@ -0,0 +1,193 @@
+import argparse
+from collections import deque
+import yaml
+import numpy as np
+from warehouse_env.layout import CompiledLayout
+
+AISLE_PATTERNS = ["single", "double", "columns"]
+
+
+def _bin_rows(height, pattern):
+    # (bin row, loading row) pairs; the last two rows are kept free for the docks
+    rows = []
+    for r in range(1, height - 2):
+        if pattern == "single" and r % 2 == 1:
+            rows.append((r, r - 1))
+        elif pattern == "double" and r % 4 == 1:
+            rows.append((r, r - 1))
+        elif pattern == "double" and r % 4 == 2:
+            rows.append((r, r + 1))
+    return rows
+
+
+def _bin_cells(height, width, pattern, cross_aisle_every):
+    cells = []
+    if pattern == "columns":
+        for c in range(1, width - 1):
+            if c % 2 == 1:
+                for r in range(1, height - 2):
+                    if cross_aisle_every and r % cross_aisle_every == 0:
+                        continue
+                    cells.append(([r, c], [r, c - 1]))
+        return cells
+
+    for r, loading_row in _bin_rows(height, pattern):
+        for c in range(1, width - 1):
+            if cross_aisle_every and c % cross_aisle_every == 0:
+                continue
+            cells.append(([r, c], [loading_row, c]))
+    return cells
+
+
+def generate_layout(
+    width,
+    height,
+    n_bins,
+    bin_slot_size,
+    pattern="double",
+    cross_aisle_every=0,
+    docks=2,
+    agents=1,
+) -> dict:
+    """Layout dict in the schema WarehouseEnv reads.
+
+    Bins are placed row by row ("single": one bin row per aisle, "double": two
+    bin rows back to back between aisles) or column by column ("columns").
+    The first and last column (first and second to last row for "columns") are
+    cross aisles, additionally every cross_aisle_every-th column (row) if given.
+    Staging in and staging out sit in the bottom corners and each get `docks`
+    loading positions spread over the bottom row. With more than one agent the
+    agents start next to each other on the top row, listed as agent-starts.
+    """
+    assert pattern in AISLE_PATTERNS, "Unknown aisle pattern " + str(pattern)
+    cells = _bin_cells(height, width, pattern, cross_aisle_every)
+    if len(cells) < n_bins:
+        raise AssertionError(
+            "Only {} bins fit into a {}x{} {} layout".format(len(cells), height, width, pattern)
+        )
+    bins = [
+        {"position": position, "loading": [loading]} for position, loading in cells[:n_bins]
+    ]
+
+    # docks on the bottom row, left half for staging in and right half for staging out
+    bottom = height - 1
+    half = (width - 2) // 2
+    assert half >= docks, "Layout too narrow for " + str(docks) + " docks"
+    in_columns = np.linspace(1, half, docks, dtype=int)
+    out_columns = np.linspace(width - 2, width - 1 - half, docks, dtype=int)
+    assert agents <= width, "Top row too narrow for " + str(agents) + " agents"
+
+    layout = {
+        "width": width,
+        "height": height,
+        "agent-start": {"position": [0, 0], "slot": 1},
+        "bin-slot-size": bin_slot_size,
+        "bins": bins,
+        "staging-in": {
+            "position": [bottom, 0],
+            "loading": [[bottom - 1, 0]] + [[bottom, int(c)] for c in in_columns],
+        },
+        "staging-out": {
+            "position": [bottom, width - 1],
+            "loading": [[bottom - 1, width - 1]] + [[bottom, int(c)] for c in out_columns],
+        },
+    }
+    if agents > 1:
+        layout["agent-starts"] = [{"position": [0, c], "slot": 1} for c in range(agents)]
+    return layout
+
+
+def validate_layout(layout):
+    """Raises an AssertionError if the layout breaks a rule, returns the CompiledLayout otherwise"""
+    for key in ["width", "height", "agent-start", "bin-slot-size", "bins", "staging-in", "staging-out"]:
+        assert key in layout, "Layout is missing " + key
+    height, width = layout["height"], layout["width"]
+    containers = layout["bins"] + [layout["staging-in"], layout["staging-out"]]
+
+    def in_grid(pos):
+        return 0 <= pos[0] < height and 0 <= pos[1] < width
+
+    for c in containers:
+        assert in_grid(c["position"]), "Position outside of the grid: " + str(c["position"])
+        for pos in c["loading"]:
+            assert in_grid(pos), "Loading position outside of the grid: " + str(pos)
+    positions = [tuple(c["position"]) for c in containers]
+    assert len(set(positions)) == len(positions), "Two bins share a position"
+
+    # also checks that loading positions don't overlap
+    compiled = CompiledLayout(layout)
+
+    loading = compiled.loading_cells[:, :2]
+    assert not compiled.blocked[loading[:, 0], loading[:, 1]].any(), (
+        "Loading position on a bin or staging area"
+    )
+    start = layout["agent-start"]["position"]
+    assert in_grid(start) and not compiled.blocked[start[0], start[1]], (
+        "agent-start is outside of the grid or blocked"
+    )
+
+    reachable = reachable_cells(compiled.blocked, start)
+    unreachable = loading[~reachable[loading[:, 0], loading[:, 1]]]
+    assert len(unreachable) == 0, (
+        "Loading positions not reachable from agent-start: " + str(unreachable.tolist())
+    )
+
+    # optional, used by MultiAgentWarehouseEnv
+    if "agent-starts" in layout:
+        starts = [tuple(a["position"]) for a in layout["agent-starts"]]
+        assert len(set(starts)) == len(starts), "Two agents share a start position"
+        for pos in starts:
+            assert in_grid(pos) and reachable[pos[0], pos[1]], (
+                "Agent start outside of the grid, blocked or not reachable: " + str(pos)
+            )
+    return compiled
+
+
+def reachable_cells(blocked, start):
+    # breadth first search over the free cells, returns a [height, width] mask
+    height, width = blocked.shape
+    free = (~blocked).tolist()
+    seen = [[False] * width for _ in range(height)]
+    seen[start[0]][start[1]] = True
+    queue = deque([(start[0], start[1])])
+    while queue:
+        r, c = queue.popleft()
+        for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+            if 0 <= nr < height and 0 <= nc < width and free[nr][nc] and not seen[nr][nc]:
+                seen[nr][nc] = True
+                queue.append((nr, nc))
+    return np.array(seen, dtype=bool)
+
+
+def write_layout(layout, path):
+    with open(path, "w") as f:
+        f.write("# generated by warehouse_env.generator\n")
+        f.write("# grid is 0-based\n# [height, width]\n")
+        yaml.safe_dump(layout, f, default_flow_style=None, sort_keys=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a warehouse layout")
+    parser.add_argument("output")
+    parser.add_argument("--width", type=int, default=20)
+    parser.add_argument("--height", type=int, default=20)
+    parser.add_argument("--bins", type=int, default=50)
+    parser.add_argument("--bin-slot-size", type=int, default=2)
+    parser.add_argument("--pattern", choices=AISLE_PATTERNS, default="double")
+    parser.add_argument("--cross-aisle-every", type=int, default=0)
+    parser.add_argument("--docks", type=int, default=2)
+    parser.add_argument("--agents", type=int, default=1)
+    args = parser.parse_args()
+
+    layout = generate_layout(
+        args.width,
+        args.height,
+        args.bins,
+        args.bin_slot_size,
+        pattern=args.pattern,
+        cross_aisle_every=args.cross_aisle_every,
+        docks=args.docks,
+        agents=args.agents,
+    )
+    validate_layout(layout)
+    write_layout(layout, args.output)
@@ -0,0 +1,81 @@
+class Inventory:
+    """Index of the slot ids stored in bins, kept up to date by Bin.place_item/remove_item.
+
+    Slot ids are 1-based. Used and free ids are kept in two lists with the position
+    of every id, so adding, removing and sampling ids are all constant time.
+    """
+
+    __slots__ = ("max_items_in_env", "_bins", "_used", "_free", "_index", "_held")
+
+    def __init__(self, max_items_in_env: int):
+        self.max_items_in_env = max_items_in_env
+        self._bins = [None] * (max_items_in_env + 1)
+        self._used = []
+        self._free = list(range(1, max_items_in_env + 1))
+        self._index = [0] + list(range(max_items_in_env))
+        self._held = [False] * (max_items_in_env + 1)
+
+    def store(self, slot: int, b):
+        assert self._bins[slot] is None, "Slot " + str(slot) + " is already stored"
+        self._bins[slot] = b
+        if self._held[slot]:
+            self._held[slot] = False
+            self._append(slot, self._used)
+        else:
+            self._move(slot, self._free, self._used)
+
+    def release(self, slot: int):
+        if self._held[slot]:
+            self._held[slot] = False
+            self._append(slot, self._free)
+            return
+        assert self._bins[slot] is not None, "Slot " + str(slot) + " is not stored"
+        self._bins[slot] = None
+        self._move(slot, self._used, self._free)
+
+    def hold(self, slot: int):
+        """Takes a slot id out of the used and the free ids until it is stored or released"""
+        assert not self._held[slot], "Slot " + str(slot) + " is already held"
+        self._remove(slot, self._used if self._bins[slot] is not None else self._free)
+        self._bins[slot] = None
+        self._held[slot] = True
+
+    def is_stored(self, slot: int) -> bool:
+        return self._bins[slot] is not None
+
+    def is_free(self, slot: int) -> bool:
+        # neither stored nor held
+        return self._bins[slot] is None and not self._held[slot]
+
+    def bin_of(self, slot: int):
+        return self._bins[slot]
+
+    def used_slot_ids(self):
+        # live list, callers must not modify it
+        return self._used
+
+    def free_slot_ids(self):
+        # live list, callers must not modify it
+        return self._free
+
+    def count_used(self) -> int:
+        return len(self._used)
+
+    def count_free(self) -> int:
+        return len(self._free)
+
+    def _move(self, slot: int, source, target):
+        self._remove(slot, source)
+        self._append(slot, target)
+
+    def _remove(self, slot: int, source):
+        # swap-remove
+        index = self._index[slot]
+        last = source.pop()
+        if last != slot:
+            source[index] = last
+            self._index[last] = index
+
+    def _append(self, slot: int, target):
+        self._index[slot] = len(target)
+        target.append(slot)
@@ -1,4 +1,11 @@
 class Item:
+    # one instance per stored unit, __slots__ keeps them small
+    __slots__ = (
+        "slot",
+        "had_first_place_in_bin_reward",
+        "had_first_remove_from_bin_reward",
+    )
+
     def __init__(self, slot: int):
         self.slot = slot
         self.had_first_place_in_bin_reward = False
@@ -0,0 +1,189 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import yaml
+import numpy as np
+from warehouse_env.constants import MOVE_UP, MOVE_DOWN, MOVE_LEFT, MOVE_RIGHT
+
+NO_CONTAINER = -1
+MOVE_DELTAS = [
+    (MOVE_UP, -1, 0),
+    (MOVE_DOWN, 1, 0),
+    (MOVE_LEFT, 0, -1),
+    (MOVE_RIGHT, 0, 1),
+]
+
+# bump when the compiled arrays change, old cache entries are ignored then
+CACHE_VERSION = 2
+CACHE_DIR_VARIABLE = "WAREHOUSE_LAYOUT_CACHE"
+ARRAYS = ["blocked", "loading_index", "loading_cells", "static_state", "move_mask"]
+
+
+def load_layout(layout_path):
+    with open(layout_path, "r") as f:
+        try:
+            return yaml.safe_load(f)
+        except yaml.YAMLError as exc:
+            print(exc)
+
+
+class CompiledLayout:
+    """Array view of a layout: containers are indexed as bins 0..n-1, then staging in, staging out"""
+
+    def __init__(self, layout, arrays=None):
+        self.layout = layout
+        self.height = layout["height"]
+        self.width = layout["width"]
+        self.bin_slot_size = layout["bin-slot-size"]
+        self.n_bins = len(layout["bins"])
+        self.max_items_in_env = self.bin_slot_size * self.n_bins
+        self.n_channels = 3 + self.max_items_in_env * 2
+        # last observation channel, 1 at the loading positions of full bins
+        self.full_channel = self.n_channels - 1
+        self.staging_in = self.n_bins
+        self.staging_out = self.n_bins + 1
+        # directory of the cache entry, if the layout came from or went to the cache
+        self.cache_entry = None
+
+        containers = layout["bins"] + [layout["staging-in"], layout["staging-out"]]
+        self.container_positions = [c["position"] for c in containers]
+        self.loading_positions = [c["loading"] for c in containers]
+
+        if arrays is not None:
+            # loaded from the cache, possibly read-only memory maps
+            for name in ARRAYS:
+                setattr(self, name, arrays[name])
+            return
+
+        self.blocked = np.zeros((self.height, self.width), dtype=bool)
+        for pos in self.container_positions:
+            self.blocked[pos[0], pos[1]] = True
+
+        self.loading_index = np.full(
+            (self.height, self.width), NO_CONTAINER, dtype=np.int32
+        )
+        for index, positions in enumerate(self.loading_positions):
+            for pos in positions:
+                if self.loading_index[pos[0], pos[1]] != NO_CONTAINER:
+                    raise AssertionError(
+                        "Loading positions of bins or staging must not overlap: "
+                        + str(pos)
+                    )
+                self.loading_index[pos[0], pos[1]] = index
+
+        # flat list of all loading cells, used for batched scatter into observations
+        cells = [
+            (pos[0], pos[1], index)
+            for index, positions in enumerate(self.loading_positions)
+            for pos in positions
+        ]
+        self.loading_cells = np.array(cells, dtype=np.int64).reshape(-1, 3)
+
+        # observation planes that never change, only the blocked positions for now
+        self.static_state = np.zeros(
+            (self.height, self.width, self.n_channels), dtype=np.int8
+        )
+        self.static_state[:, :, 0] = self.blocked
+
+        # [row, col, move action] -> the move stays on the grid and off the bins
+        free = np.pad(~self.blocked, 1, constant_values=False)
+        self.move_mask = np.zeros((self.height, self.width, 4), dtype=bool)
+        for action, dr, dc in MOVE_DELTAS:
+            self.move_mask[:, :, action] = free[
+                1 + dr : 1 + dr + self.height, 1 + dc : 1 + dc + self.width
+            ]
+
+    def container_cells(self, index):
+        return self.loading_cells[self.loading_cells[:, 2] == index, :2]
+
+
+def default_cache_dir():
+    return os.environ.get(
+        CACHE_DIR_VARIABLE,
+        os.path.join(os.path.expanduser("~"), ".cache", "warehouse_env", "layouts"),
+    )
+
+
+def compile_layout(layout_path, cache_dir=None, use_cache=True) -> CompiledLayout:
+    """CompiledLayout of a YAML file, cached on disk by a hash of the file content.
+
+    Cached arrays are opened as read-only memory maps, so all processes using the
+    same layout share one copy in the page cache. Every call returns a new layout
+    dict, envs may modify theirs.
+    """
+    if not use_cache:
+        return CompiledLayout(load_layout(layout_path))
+
+    with open(layout_path, "rb") as f:
+        content = f.read()
+    key = hashlib.sha256(content + str(CACHE_VERSION).encode()).hexdigest()
+    entry = os.path.join(cache_dir or default_cache_dir(), key)
+
+    if os.path.exists(os.path.join(entry, "layout.json")):
+        with open(os.path.join(entry, "layout.json"), "r") as f:
+            layout = json.load(f)
+        # plain ndarray views of the maps, np.memmap indexing is slow for single cells
+        arrays = {
+            name: np.load(os.path.join(entry, name + ".npy"), mmap_mode="r").view(
+                np.ndarray
+            )
+            for name in ARRAYS
+        }
+        compiled = CompiledLayout(layout, arrays)
+        compiled.cache_entry = entry
+        return compiled
+
+    compiled = CompiledLayout(yaml.safe_load(content))
+    _write_cache_entry(entry, compiled)
+    if os.path.exists(os.path.join(entry, "layout.json")):
+        compiled.cache_entry = entry
+    return compiled
+
+
+def load_cached_arrays(compiled, names):
+    """Extra arrays stored next to a cached layout by save_cached_arrays, None if any is missing"""
+    if compiled.cache_entry is None:
+        return None
+    paths = [os.path.join(compiled.cache_entry, name + ".npy") for name in names]
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    return {
+        name: np.load(path, mmap_mode="r").view(np.ndarray)
+        for name, path in zip(names, paths)
+    }
+
+
+def save_cached_arrays(compiled, arrays):
+    if compiled.cache_entry is None:
+        return
+    for name, array in arrays.items():
+        tmp = None
+        try:
+            fd, tmp = tempfile.mkstemp(dir=compiled.cache_entry, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp, os.path.join(compiled.cache_entry, name + ".npy"))
+        except OSError:
+            # the cache is optional, the arrays are computed again next time
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def _write_cache_entry(entry, compiled):
+    parent = os.path.dirname(entry)
+    tmp = None
+    try:
+        os.makedirs(parent, exist_ok=True)
+        # write to a temporary directory and rename, concurrent workers may race here
+        tmp = tempfile.mkdtemp(dir=parent)
+        for name in ARRAYS:
+            np.save(os.path.join(tmp, name + ".npy"), getattr(compiled, name))
+        with open(os.path.join(tmp, "layout.json"), "w") as f:
+            json.dump(compiled.layout, f)
+        os.rename(tmp, entry)
+    except OSError:
+        # another worker won the race or the cache is not writable, the cache is optional
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,169 @@
+import gym
+import numpy as np
+from gym import spaces
+from warehouse_env.paths import distance_table
+from warehouse_env.constants import INVALID_ACTION
+
+UNREACHABLE = np.iinfo(np.int32).max
+
+
+class MacroActionWrapper(gym.Wrapper):
+    """Hierarchical actions for a single agent WarehouseEnv, the travel runs inside the env.
+
+    Actions 0..M-1 load slot id a + 1: the agent walks along a shortest path to
+    the closest loading position of the bin or staging in holding the item and
+    loads it. Actions M..M+n_bins unload the carried item at bin a - M if it has
+    free capacity, the last one at staging out. The slot of an unload is always
+    the carried one and the container of a load the one holding the item, so
+    both need only one index.
+
+    step returns the observation after the load or unload, the summed reward of
+    all primitive steps and info["steps"], the number of primitive steps taken.
+    A macro that can't be carried out leaves the env as it is and returns
+    INVALID_ACTION with info["steps"] = 0. info["action_mask"] is the mask over
+    the macro actions.
+    """
+
+    def __init__(self, env, use_cache=True):
+        super().__init__(env)
+        compiled = env.unwrapped.compiled_layout
+        self.n_slots = compiled.max_items_in_env
+        self.n_bins = compiled.n_bins
+        self.action_space = spaces.Discrete(self.n_slots + self.n_bins + 1)
+        self.table = distance_table(compiled, use_cache=use_cache)
+        self._container_cells = []
+        for i in range(len(env.unwrapped.containers)):
+            cells = compiled.container_cells(i)
+            self._container_cells.append(
+                self.table.cell_index[cells[:, 0], cells[:, 1]].astype(np.int64)
+            )
+        # [cell, container] -> a loading position of the container can be reached
+        distance = self.table.distance
+        self._reachable = np.stack(
+            [(distance[:, cells] >= 0).any(axis=1) for cells in self._container_cells],
+            axis=1,
+        )
+
+    def load_action(self, slot: int) -> int:
+        return slot - 1
+
+    def unload_action(self, container: int) -> int:
+        # container index of the compiled layout, bins or staging out
+        staging_out = self.unwrapped.compiled_layout.staging_out
+        assert container < self.n_bins or container == staging_out, (
+            "Only bins and staging out can be unloaded to: " + str(container)
+        )
+        if container == staging_out:
+            return self.n_slots + self.n_bins
+        return self.n_slots + container
+
+    def reset(self, **kwargs):
+        result = self.env.reset(**kwargs)
+        if kwargs.get("return_info"):
+            observation, info = result
+            info["action_mask"] = self.action_mask()
+            return observation, info
+        return result
+
+    def step(self, action):
+        env = self.unwrapped
+        agent = env.agent
+        profiler = env._profiler
+        action = int(action)
+        container, primitive = self._target(action)
+
+        reward = 0.0
+        steps = 0
+        done = False
+        if container is None:
+            reward = INVALID_ACTION
+            env.invalid_action_counter += 1
+        else:
+            at = self.table.index(agent.agent_pos)
+            cells = self._container_cells[container]
+            distances = self.table.distance[at, cells].astype(np.int64)
+            target = cells[np.argmin(np.where(distances >= 0, distances, UNREACHABLE))]
+            while at != target and not done:
+                move = int(self.table.next_move[at, target])
+                if profiler is None:
+                    step_reward, done = env._step(move)
+                else:
+                    step_reward, done = profiler.call("step", env._step, move)
+                reward += step_reward
+                steps += 1
+                at = self.table.index(agent.agent_pos)
+            if not done:
+                if profiler is None:
+                    step_reward, done = env._step(primitive)
+                else:
+                    step_reward, done = profiler.call("step", env._step, primitive)
+                reward += step_reward
+                steps += 1
+
+        if profiler is None:
+            observation = env._next_state()
+            info = env._info(done)
+        else:
+            observation = profiler.call("next_state", env._next_state)
+            info = profiler.call("info", env._info, done)
+        if env.debug_checks:
+            env._check_observation(observation)
+        info["action_mask"] = self.action_mask()
+        info["steps"] = steps
+        return observation, reward, done, info
+
+    def action_mask(self):
+        env = self.unwrapped
+        agent = env.agent
+        at = self.table.index(agent.agent_pos)
+        reachable = self._reachable[at]
+        mask = np.zeros(self.action_space.n, dtype=bool)
+        if agent.loaded_item is None:
+            # the bins and staging in rows of the contents table
+            contents = env._contents[: self.n_bins + 1, 1:]
+            reachable_contents = contents & reachable[: self.n_bins + 1, None]
+            mask[: self.n_slots] = reachable_contents.any(axis=0)
+        else:
+            free = env._free_capacity > 0
+            bins = reachable[: self.n_bins] & free
+            mask[self.n_slots : self.n_slots + self.n_bins] = bins
+            staging_out = env.compiled_layout.staging_out
+            slot = agent.loaded_item.slot
+            mask[-1] = reachable[staging_out] and env._contents[staging_out, slot]
+        return mask
+
+    def _target(self, action):
+        """(container to travel to, primitive action to finish with), None if not possible"""
+        env = self.unwrapped
+        agent = env.agent
+        at = self.table.index(agent.agent_pos)
+        if 0 <= action < self.n_slots:
+            slot = action + 1
+            if agent.loaded_item is not None:
+                return None, None
+            b = env.inventory.bin_of(slot)
+            if b is not None:
+                container = env._container_index[b.pos]
+            elif slot in env.staging_in.get_used_slot_ids():
+                container = env.compiled_layout.staging_in
+            else:
+                return None, None
+            primitive = env.load_actions[slot - 1]
+        elif self.n_slots <= action < self.action_space.n:
+            container = action - self.n_slots
+            if container == self.n_bins:
+                container = env.compiled_layout.staging_out
+            if agent.loaded_item is None:
+                return None, None
+            slot = agent.loaded_item.slot
+            if container == env.compiled_layout.staging_out:
+                if not env._contents[container, slot]:
+                    return None, None
+            elif env._free_capacity[container] == 0:
+                return None, None
+            primitive = env.unload_actions[slot - 1]
+        else:
+            raise AssertionError("Invalid action Type.")
+        if not self._reachable[at, container]:
+            return None, None
+        return container, primitive
@@ -0,0 +1,140 @@
+from collections import deque
+import numpy as np
+from gym import spaces
+from warehouse_env.warehouse import WarehouseEnv
+from warehouse_env.constants import INVALID_ACTION
+
+
+class MultiAgentWarehouseEnv(WarehouseEnv):
+    """WarehouseEnv with one robot per entry of the layout's agent-starts list.
+
+    step takes one action per robot. All robots share the pick or put transaction
+    and can work on different items of it at the same time. Moves are resolved
+    simultaneously: robots may follow each other, vertex conflicts go to the
+    robot with the lowest index and both robots of a swap wait. Robots that lose
+    a conflict wait in place and get INVALID_ACTION. Loads and unloads run in
+    robot order, so of two robots loading the same slot only the first succeeds.
+
+    The observation is the shared tensor with every robot marked in channel 1.
+    The reward is the sum over all robots, info["rewards"] holds the reward of
+    every robot, info["conflicts"] the number of moves lost to a conflict and
+    info["action_mask"] the [agent, action] mask of action_mask().
+    """
+
+    def __init__(self, layout_path="layout.yml", **kwargs):
+        super(MultiAgentWarehouseEnv, self).__init__(layout_path, **kwargs)
+        self.n_agents = len(self.agents)
+        self.action_space = spaces.MultiDiscrete([len(self.actions)] * self.n_agents)
+
+    def _agent_starts(self):
+        starts = [a["position"] for a in self.layout["agent-starts"]]
+        cells = set(tuple(pos) for pos in starts)
+        assert len(cells) == len(starts), "Two agents share a start position"
+        for pos in starts:
+            assert not self.compiled_layout.blocked[pos[0], pos[1]], (
+                "Agent start on a bin or staging area: " + str(pos)
+            )
+        return starts
+
+    def _step(self, actions):
+        actions = [int(a) for a in actions]
+        assert len(actions) == self.n_agents, "One action per agent expected"
+        if self.debug_checks:
+            state = self._state.copy()
+
+        rewards = [0.0] * self.n_agents
+        current = [agent.agent_pos for agent in self.agents]
+        targets = list(current)
+        for i, (agent, action) in enumerate(zip(self.agents, actions)):
+            if action < self.load_actions[0]:
+                target = agent.move_target(action)
+                if target is None:
+                    rewards[i] = INVALID_ACTION
+                else:
+                    targets[i] = target
+
+        cells = self._resolve_moves(current, targets)
+        movers = [i for i in range(self.n_agents) if cells[i] != current[i]]
+        # clear all old cells first, a robot may move into the cell another one leaves
+        for i in movers:
+            self._patch_agent(current[i], self.agents[i].loaded_item, 0)
+        for i in movers:
+            agent = self.agents[i]
+            agent.agent_pos = cells[i]
+            self._patch_agent(cells[i], agent.loaded_item, 1)
+
+        conflicts = 0
+        for i, action in enumerate(actions):
+            if action < self.load_actions[0]:
+                if targets[i] != cells[i]:
+                    rewards[i] = INVALID_ACTION
+                    conflicts += 1
+            else:
+                rewards[i] = self._apply_item_action(self.agents[i], action)
+
+        self.invalid_action_counter += sum(1 for r in rewards if r < 0)
+        # per robot results of the last step, for info
+        self._rewards = rewards
+        self._conflicts = conflicts
+        if self.debug_checks:
+            occupied = set(agent.agent_pos for agent in self.agents)
+            assert len(occupied) == self.n_agents, "Two agents in one cell"
+            if all(r < 0 for r in rewards):
+                assert np.array_equal(state, self._state)
+        if self._profiler is None:
+            return sum(rewards), self._is_episode_done()
+        done = self._profiler.call("is_episode_done", self._is_episode_done)
+        return sum(rewards), done
+
+    def _info(self, done):
+        return {
+            "rewards": self._rewards,
+            "conflicts": self._conflicts,
+            "action_mask": self.action_mask(),
+        }
+
+    def action_mask(self, agent=None):
+        """[agent, action] masks of all robots, or the mask of one robot.
+
+        Other robots are not taken into account, a move into an occupied cell
+        may still lose a conflict.
+        """
+        if agent is not None:
+            return super(MultiAgentWarehouseEnv, self).action_mask(agent)
+        return np.stack(
+            [super(MultiAgentWarehouseEnv, self).action_mask(a) for a in self.agents]
+        )
+
+    @staticmethod
+    def _resolve_moves(current, targets):
+        """Cells the robots end up in, given their current and wanted cells.
+
+        Conflicts are found through dicts keyed by cell, so this stays linear in
+        the number of robots instead of comparing every pair.
+        """
+        occupant = {cell: i for i, cell in enumerate(current)}
+        claims = {}
+        for i, cell in enumerate(targets):
+            if cell != current[i]:
+                claims.setdefault(cell, []).append(i)
+        moving = [cell != current[i] for i, cell in enumerate(targets)]
+
+        for cell, robots in claims.items():
+            # vertex conflict, claims are in robot order so the first one wins
+            for i in robots[1:]:
+                moving[i] = False
+            # swap conflict, two robots trading cells would pass through each other
+            j = occupant.get(cell)
+            if j is not None and targets[j] == current[robots[0]]:
+                moving[robots[0]] = False
+                moving[j] = False
+
+        # a robot can only enter a cell whose robot leaves it
+        waiting = deque(i for i in range(len(current)) if not moving[i])
+        while waiting:
+            i = waiting.popleft()
+            for k in claims.get(current[i], ()):
+                if moving[k]:
+                    moving[k] = False
+                    waiting.append(k)
+        return [targets[i] if moving[i] else current[i] for i in range(len(current))]
@@ -0,0 +1,142 @@
+import argparse
+import numpy as np
+from warehouse_env.paths import distance_table, MOVES
+
+UNREACHABLE = np.iinfo(np.int32).max
+
+
+class OraclePolicy:
+    """Scripted policy that finishes the current transaction along shortest paths.
+
+    Pick: fetch the incoming item whose bin is the shortest detour on the way to
+    staging out and deliver it. Put: take an item from staging in and store it in
+    the closest bin with free capacity. Any other carried item is stored in the
+    closest bin with free capacity first.
+    Picks go first when a pick and a put are open (continuous operation), with
+    neither open the agent waits next to staging in. Needs a single agent
+    WarehouseEnv, act() reads the env, not the observation.
+    """
+
+    def __init__(self, env, use_cache=True):
+        self.env = env
+        self.table = distance_table(env.compiled_layout, use_cache=use_cache)
+        compiled = env.compiled_layout
+        self._container_cells = [
+            self._cell_ids(compiled.container_cells(i)) for i in range(len(env.containers))
+        ]
+        self._bin_cells = np.concatenate(self._container_cells[: compiled.n_bins])
+        # bin of every entry of _bin_cells
+        self._bin_cell_owner = np.repeat(
+            np.arange(compiled.n_bins),
+            [len(cells) for cells in self._container_cells[: compiled.n_bins]],
+        )
+        self._bin_index = {b.pos: i for i, b in enumerate(env.bins)}
+        # distance of every cell to the closest staging out loading position
+        self._to_staging_out = self._distances(
+            self._container_cells[compiled.staging_out]
+        ).min(axis=1)
+
+    def act(self, observation=None) -> int:
+        env = self.env
+        pos = env.agent.agent_pos
+        item = env.agent.loaded_item
+        compiled = env.compiled_layout
+        is_pick = len(env.staging_out.incoming) > 0
+
+        if item is not None:
+            unload = env.unload_actions[item.slot - 1]
+            if item.slot in env.staging_out.incoming:
+                return self._go_and(pos, compiled.staging_out, unload)
+            return self._go_and(pos, None, unload)
+
+        if is_pick:
+            at = self.table.index(pos)
+            best, best_cost = None, UNREACHABLE
+            for slot in env.staging_out.incoming:
+                b = env.inventory.bin_of(slot)
+                assert b is not None, "Item " + str(slot) + " of the pick is in no bin"
+                cells = self._container_cells[self._bin_index[b.pos]]
+                to_bin = self._distances(cells, at)
+                cost = np.where(
+                    to_bin >= 0, to_bin + self._to_staging_out[cells], UNREACHABLE
+                ).min()
+                if cost < best_cost:
+                    best, best_cost = slot, cost
+            assert best is not None, "No reachable item of the pick transaction"
+            b = self._bin_index[env.inventory.bin_of(best).pos]
+            return self._go_and(pos, b, env.load_actions[best - 1])
+
+        slot = next(iter(env.staging_in.get_used_slot_ids()), None)
+        if slot is not None:
+            return self._go_and(pos, compiled.staging_in, env.load_actions[slot - 1])
+        return self._go_and(pos, compiled.staging_in, self._step_aside(pos))
+
+    def _go_and(self, pos, container, action):
+        # action once a loading position of the container is reached, for None any bin
+        # with free capacity
+        index = self.env.compiled_layout.loading_index[pos[0], pos[1]]
+        if container is None:
+            free = self.env._free_capacity > 0
+            if 0 <= index < len(self.env.bins) and free[index]:
+                return action
+            cells = self._bin_cells[free[self._bin_cell_owner]]
+        else:
+            if index == container:
+                return action
+            cells = self._container_cells[container]
+
+        at = self.table.index(pos)
+        distances = self._distances(cells, at)
+        assert (distances >= 0).any(), "No path from " + str(list(pos))
+        target = cells[np.argmin(np.where(distances >= 0, distances, UNREACHABLE))]
+        return int(self.table.next_move[at, target])
+
+    def _step_aside(self, pos):
+        # some valid move, there is no wait action
+        at = self.table.index(pos)
+        for action, _, _ in MOVES:
+            if self.table.neighbors[at, action] < len(self.table.cells):
+                return action
+        raise AssertionError("Agent at " + str(list(pos)) + " can't move")
+
+    def _distances(self, cells, at=None):
+        if at is None:
+            return self.table.distance[:, cells].astype(np.int64)
+        return self.table.distance[at, cells].astype(np.int64)
+
+    def _cell_ids(self, positions):
+        return self.table.cell_index[positions[:, 0], positions[:, 1]].astype(np.int64)
+
+
+def run_episodes(env, policy, episodes, max_steps=10000):
+    """Steps per finished episode when env is controlled by policy"""
+    lengths = []
+    for _ in range(episodes):
+        observation = env.reset()
+        for step in range(1, max_steps + 1):
+            observation, _, done, _ = env.step(policy.act(observation))
+            if done:
+                break
+        else:
+            raise AssertionError("Episode not done after " + str(max_steps) + " steps")
+        lengths.append(step)
+    return lengths
+
+
+if __name__ == "__main__":
+    from warehouse_env.warehouse import WarehouseEnv
+
+    parser = argparse.ArgumentParser(description="Throughput of the shortest path oracle")
+    parser.add_argument("layout")
+    parser.add_argument("--episodes", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    env = WarehouseEnv(args.layout, verbose=False)
+    env.seed(args.seed)
+    lengths = run_episodes(env, OraclePolicy(env), args.episodes)
+    print(
+        "{} episodes, {:.1f} steps per episode, {:.3f} items per step".format(
+            len(lengths), np.mean(lengths), env.item_counter / sum(lengths)
+        )
+    )
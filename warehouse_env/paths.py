@@ -0,0 +1,127 @@
+import numpy as np
+from warehouse_env.layout import (
+    CompiledLayout,
+    load_cached_arrays,
+    save_cached_arrays,
+    MOVE_DELTAS as MOVES,
+)
+
+NO_PATH = -1
+
+
+class DistanceTable:
+    """All-pairs shortest paths over the free cells of a layout.
+
+    Free cells are numbered row by row, cell_index maps [row, col] to that number
+    (-1 for blocked cells). distance[a, b] is the number of moves between cells a
+    and b, next_move[a, b] the first move action of a shortest path from a to b.
+    Both are NO_PATH if b can't be reached, distance[a, a] is 0 and next_move[a, a]
+    is NO_PATH.
+    """
+
+    def __init__(self, blocked, distance=None, next_move=None):
+        self.blocked = blocked
+        self.cell_index = np.full(blocked.shape, -1, dtype=np.int32)
+        self.cells = np.argwhere(~blocked)
+        self.cell_index[self.cells[:, 0], self.cells[:, 1]] = np.arange(len(self.cells))
+        self.neighbors = self._neighbors()
+
+        if distance is None:
+            distance = self._distances()
+            next_move = self._next_moves(distance)
+        self.distance = distance
+        self.next_move = next_move
+
+    def index(self, pos):
+        return self.cell_index[pos[0], pos[1]]
+
+    def distance_between(self, a, b) -> int:
+        return int(self.distance[self.index(a), self.index(b)])
+
+    def next_action(self, pos, target):
+        action = self.next_move[self.index(pos), self.index(target)]
+        return int(action) if action != NO_PATH else None
+
+    def nearest(self, pos, targets):
+        """(target, distance) of the closest reachable target cell, (None, NO_PATH) if none is"""
+        ids = self.cell_index[[t[0] for t in targets], [t[1] for t in targets]]
+        distances = self.distance[self.index(pos), ids]
+        reachable = np.nonzero(distances >= 0)[0]
+        if len(reachable) == 0:
+            return None, NO_PATH
+        best = reachable[np.argmin(distances[reachable])]
+        return targets[best], int(distances[best])
+
+    def _neighbors(self):
+        # [cell, move] -> neighbor cell, the extra row n is a dummy that is never reached
+        n = len(self.cells)
+        height, width = self.blocked.shape
+        neighbors = np.full((n + 1, 4), n, dtype=np.int64)
+        for action, dr, dc in MOVES:
+            r = self.cells[:, 0] + dr
+            c = self.cells[:, 1] + dc
+            inside = (r >= 0) & (r < height) & (c >= 0) & (c < width)
+            target = np.full(n, -1, dtype=np.int64)
+            target[inside] = self.cell_index[r[inside], c[inside]]
+            neighbors[:n, action] = np.where(target >= 0, target, n)
+        return neighbors
+
+    def _distances(self):
+        # one breadth first search per cell, all run together: bit s of reached[cell]
+        # tells whether the search started at cell s got to cell yet
+        n = len(self.cells)
+        n_words = (n + 63) // 64
+        dtype = np.int16 if n < 2 ** 15 else np.int32
+        # [cell, word, bit] view of the distances, padded to whole words
+        distance = np.full((n, n_words, 64), NO_PATH, dtype=dtype)
+        if n == 0:
+            return distance.reshape(0, 0)
+        ids = np.arange(n)
+        distance[ids, ids // 64, ids % 64] = 0
+
+        reached = np.zeros((n + 1, n_words), dtype=np.uint64)
+        reached[ids, ids // 64] = np.left_shift(
+            np.uint64(1), (ids % 64).astype(np.uint64)
+        )
+        steps = 0
+        while True:
+            steps += 1
+            grown = reached[:n].copy()
+            for action, _, _ in MOVES:
+                grown |= reached[self.neighbors[:n, action]]
+            new = grown & ~reached[:n]
+            cells, words = np.nonzero(new)
+            if len(cells) == 0:
+                return np.ascontiguousarray(distance.reshape(n, -1)[:, :n])
+            bits = np.unpackbits(
+                new[cells, words].astype("<u8").view(np.uint8).reshape(-1, 8),
+                axis=1,
+                bitorder="little",
+            ).view(bool)
+            distance[cells, words] = np.where(bits, steps, distance[cells, words])
+            reached[:n] = grown
+
+    def _next_moves(self, distance):
+        n = len(self.cells)
+        next_move = np.full((n, n), NO_PATH, dtype=np.int8)
+        # the dummy neighbor row never matches, distances are >= NO_PATH
+        padded = np.vstack([distance, np.full((1, n), NO_PATH - 1, dtype=distance.dtype)])
+        for action, _, _ in MOVES:
+            closer = padded[self.neighbors[:n, action]] == distance - 1
+            next_move[(next_move == NO_PATH) & closer & (distance > 0)] = action
+        return next_move
+
+
+def distance_table(compiled: CompiledLayout, use_cache=True) -> DistanceTable:
+    """DistanceTable of a compiled layout, stored with the layout in the layout cache"""
+    if use_cache:
+        arrays = load_cached_arrays(compiled, ["distance", "next_move"])
+        if arrays is not None:
+            return DistanceTable(compiled.blocked, arrays["distance"], arrays["next_move"])
+
+    table = DistanceTable(compiled.blocked)
+    if use_cache:
+        save_cached_arrays(
+            compiled, {"distance": table.distance, "next_move": table.next_move}
+        )
+    return table
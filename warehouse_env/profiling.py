@@ -0,0 +1,108 @@
+import time
+import bisect
+import cProfile
+import pstats
+
+# upper bounds of the duration histogram buckets in microseconds, the last bucket is open
+HISTOGRAM_BOUNDS_US = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 10000)
+
+PHASES = (
+    "step",
+    "move",
+    "load_item",
+    "unload_item",
+    "is_episode_done",
+    "next_state",
+    "info",
+    "transaction",
+    "render",
+)
+
+
+class PhaseTimer:
+    __slots__ = ("calls", "total_ns", "max_ns", "histogram")
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS_US) + 1)
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "total_sec": self.total_ns / 1e9,
+            "mean_us": self.total_ns / 1e3 / max(1, self.calls),
+            "max_us": self.max_ns / 1e3,
+            "histogram": list(self.histogram),
+        }
+
+
+class StepProfiler:
+    """Per-phase timing counters of a WarehouseEnv, created by env.enable_profiling().
+
+    The env times its phases with call(phase, function, *args) while profiling is
+    on, otherwise it calls the functions directly. Every call is counted, its
+    time.perf_counter_ns duration summed, the maximum kept and a histogram over
+    HISTOGRAM_BOUNDS_US updated. Phases nest, "step" includes "move" and
+    "is_episode_done" for example, the moves of MultiAgentWarehouseEnv are resolved
+    in its "step" and don't show up in "move".
+
+    With cprofile=True a cProfile.Profile runs while the env is inside a timed
+    phase, cprofile_stats() returns it as pstats.Stats. hook(phase, ns) is called
+    after every timed call, e.g. to sample durations into an external logger.
+    """
+
+    def __init__(self, cprofile=False, hook=None):
+        self.hook = hook
+        self.timers = {phase: PhaseTimer() for phase in PHASES}
+        self._profile = cProfile.Profile() if cprofile else None
+        self._bounds = [bound * 1000 for bound in HISTOGRAM_BOUNDS_US]
+        self._depth = 0
+
+    def call(self, phase, function, *args, **kwargs):
+        self._depth += 1
+        if self._depth == 1 and self._profile is not None:
+            self._profile.enable()
+        start = time.perf_counter_ns()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            ns = time.perf_counter_ns() - start
+            self._depth -= 1
+            if self._depth == 0 and self._profile is not None:
+                self._profile.disable()
+            timer = self.timers[phase]
+            timer.calls += 1
+            timer.total_ns += ns
+            if ns > timer.max_ns:
+                timer.max_ns = ns
+            timer.histogram[bisect.bisect_left(self._bounds, ns)] += 1
+            if self.hook is not None:
+                self.hook(phase, ns)
+
+    def clear(self):
+        self.timers = {phase: PhaseTimer() for phase in PHASES}
+        if self._profile is not None:
+            self._profile = cProfile.Profile()
+
+    def stats(self):
+        return {
+            "steps": self.timers["step"].calls,
+            "histogram_bounds_us": list(HISTOGRAM_BOUNDS_US),
+            "phases": {phase: timer.to_dict() for phase, timer in self.timers.items()},
+        }
+
+    def cprofile_stats(self, sort="cumulative"):
+        assert self._profile is not None, "Profiling was enabled without cprofile"
+        return pstats.Stats(self._profile).sort_stats(sort)
+
+    def __getstate__(self):
+        # a cProfile.Profile can't be copied, copies start a new one
+        state = self.__dict__.copy()
+        state["_profile"] = self._profile is not None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._profile = cProfile.Profile() if state["_profile"] else None
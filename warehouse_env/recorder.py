@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import gym
+import numpy as np
+from warehouse_env.layout import load_layout, CompiledLayout
+
+INDEX_FILE = "index.json"
+CHUNK_FILE = "chunk_{:05d}.npz"
+DATA_FILE = "data.raw"
+STEPS_FILE = "steps.raw"
+STEP_DTYPE = np.dtype([("action", np.int64), ("reward", np.float32), ("done", np.bool_)])
+
+
+class EpisodeRecorder(gym.Wrapper):
+    """Records rendered rgb frames or observations of every reset/step to a directory.
+
+    Steps are buffered in chunks of chunk_size and written incrementally, either as
+    compressed .npz chunk files or appended to raw files that are read back with a
+    memory map. The action of a reset record is -1.
+    """
+
+    def __init__(self, env, path, capture="frames", chunk_size=256, compress=True):
+        super().__init__(env)
+        assert capture in ("frames", "observations")
+        self.path = path
+        self.capture = capture
+        self.chunk_size = chunk_size
+        self.compress = compress
+        os.makedirs(path, exist_ok=True)
+        if not compress:
+            # raw files are appended to, start from empty ones
+            for name in (DATA_FILE, STEPS_FILE):
+                open(os.path.join(path, name), "wb").close()
+
+        self.n_steps = 0
+        self._count = 0
+        self._data = None
+        self._steps = np.zeros(chunk_size, dtype=STEP_DTYPE)
+        self._chunks = []
+        self._episode_starts = []
+
+    def reset(self, **kwargs):
+        result = self.env.reset(**kwargs)
+        observation = result[0] if kwargs.get("return_info") else result
+        self._episode_starts.append(self.n_steps)
+        self._record(observation, -1, 0.0, False)
+        return result
+
+    def step(self, action):
+        observation, reward, done, info = self.env.step(action)
+        self._record(observation, action, reward, done)
+        return observation, reward, done, info
+
+    def close(self):
+        self.flush()
+        return self.env.close()
+
+    def flush(self):
+        if self._count > 0:
+            if self.compress:
+                name = CHUNK_FILE.format(len(self._chunks))
+                np.savez_compressed(
+                    os.path.join(self.path, name),
+                    data=self._data[: self._count],
+                    steps=self._steps[: self._count],
+                )
+                self._chunks.append(name)
+            else:
+                with open(os.path.join(self.path, DATA_FILE), "ab") as f:
+                    f.write(self._data[: self._count].tobytes())
+                with open(os.path.join(self.path, STEPS_FILE), "ab") as f:
+                    f.write(self._steps[: self._count].tobytes())
+            self._count = 0
+        self._write_index()
+
+    def _record(self, observation, action, reward, done):
+        if self.capture == "frames":
+            data = self.env.render(mode="rgb_array")
+        else:
+            data = observation
+        if self._data is None:
+            self._data = np.zeros((self.chunk_size,) + data.shape, dtype=data.dtype)
+        self._data[self._count] = data
+        self._steps[self._count] = (action, reward, done)
+        self._count += 1
+        self.n_steps += 1
+        if self._count == self.chunk_size:
+            self.flush()
+
+    def _write_index(self):
+        if self._data is None:
+            return
+        index = {
+            "capture": self.capture,
+            "format": "npz" if self.compress else "raw",
+            "dtype": self._data.dtype.str,
+            "shape": list(self._data.shape[1:]),
+            "n_steps": self.n_steps - self._count,
+            "chunks": self._chunks,
+            "episode_starts": self._episode_starts,
+        }
+        with open(os.path.join(self.path, INDEX_FILE), "w") as f:
+            json.dump(index, f)
+
+
+class Recording:
+    """Read access to a directory written by EpisodeRecorder, chunk by chunk"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), "r") as f:
+            self.index = json.load(f)
+        self.capture = self.index["capture"]
+        self.shape = tuple(self.index["shape"])
+        self.dtype = np.dtype(self.index["dtype"])
+        self.episode_starts = self.index["episode_starts"]
+
+    def __len__(self):
+        return self.index["n_steps"]
+
+    def chunks(self):
+        # yields (data, steps) without loading the whole recording
+        if self.index["format"] == "npz":
+            for name in self.index["chunks"]:
+                with np.load(os.path.join(self.path, name)) as chunk:
+                    yield chunk["data"], chunk["steps"]
+        else:
+            data, steps = self.memmap()
+            yield data, steps
+
+    def memmap(self):
+        assert self.index["format"] == "raw", "Only raw recordings can be memory mapped"
+        data = np.memmap(
+            os.path.join(self.path, DATA_FILE),
+            dtype=self.dtype,
+            mode="r",
+            shape=(len(self),) + self.shape,
+        )
+        steps = np.memmap(
+            os.path.join(self.path, STEPS_FILE),
+            dtype=STEP_DTYPE,
+            mode="r",
+            shape=(len(self),),
+        )
+        return data, steps
+
+    def __iter__(self):
+        for data, steps in self.chunks():
+            for i in range(len(steps)):
+                yield data[i], steps[i]
+
+
+def load_recording(path) -> Recording:
+    return Recording(path)
+
+
+def frame_from_observation(observation, layout: CompiledLayout):
+    """Best effort vis.Frame of an observation.
+
+    Put transaction items are marked -1 at every bin, so stored items of the
+    current put transaction are not shown in the bins.
+    """
+    from warehouse_env.vis import Frame
+
+    m = layout.max_items_in_env
+    agents = []
+    for r, c in np.argwhere(observation[:, :, 1] == 1):
+        carried = np.nonzero(observation[r, c, 2 : m + 2])[0]
+        loaded_slot = int(carried[0]) + 1 if len(carried) > 0 else None
+        agents.append(((int(r), int(c)), loaded_slot))
+
+    def slots(index, value):
+        pos = layout.loading_positions[index][0]
+        layers = observation[pos[0], pos[1], m + 2 : 2 * m + 2]
+        return tuple(int(s) + 1 for s in np.nonzero(layers == value)[0])
+
+    bins = tuple(
+        (tuple(layout.container_positions[i]), slots(i, 1))
+        for i in range(layout.n_bins)
+    )
+    staging_in = tuple(layout.container_positions[layout.staging_in]), slots(
+        layout.staging_in, 1
+    )
+    staging_out = tuple(layout.container_positions[layout.staging_out]), slots(
+        layout.staging_out, -1
+    )
+    put = slots(0, -1) if layout.n_bins > 0 else ()
+    if staging_out[1]:
+        text = "Pick with Items " + ", ".join(str(s) for s in staging_out[1])
+    elif put:
+        text = "Put with Items " + ", ".join(str(s) for s in put)
+    else:
+        text = ""
+    return Frame(tuple(agents), bins, staging_in, staging_out, text)
+
+
+def play_recording(path, fps=None, layout_path=None):
+    """Shows a recording in a WarehouseGui, observation recordings need their layout"""
+    from warehouse_env.vis import WarehouseGui, GUI_SCALING
+
+    recording = load_recording(path)
+    if recording.capture == "frames":
+        # the status bar below the grid is 30 pixels high
+        height, width = recording.shape[0] - 30, recording.shape[1]
+        gui = WarehouseGui([height // GUI_SCALING, width // GUI_SCALING], 1)
+    else:
+        assert layout_path is not None, "Observation recordings need the layout"
+        layout = CompiledLayout(load_layout(layout_path))
+        gui = WarehouseGui([layout.height, layout.width], layout.max_items_in_env)
+
+    min_interval = 1.0 / fps if fps else 0.0
+    try:
+        for data, _ in recording:
+            start = time.monotonic()
+            if recording.capture == "frames":
+                gui.draw_image(data)
+            else:
+                gui.draw_frame(frame_from_observation(data, layout), return_frame=False)
+            wait = start + min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+    finally:
+        gui.close()
@@ -0,0 +1,107 @@
+import queue
+import threading
+import multiprocessing
+import time
+
+# how often an idle worker handles window events while waiting for frames
+IDLE_TIMEOUT = 0.1
+
+
+def _render_loop(frames, grid_size, max_items_in_env, max_fps, offscreen):
+    # pygame is only used inside the worker
+    from warehouse_env.vis import WarehouseGui
+
+    gui = WarehouseGui(grid_size, max_items_in_env, offscreen=offscreen)
+    min_interval = 1.0 / max_fps if max_fps else 0.0
+    last_draw = 0.0
+    try:
+        while True:
+            try:
+                frame = frames.get(timeout=IDLE_TIMEOUT)
+            except queue.Empty:
+                gui.handle_events()
+                continue
+            if frame is None:
+                break
+
+            wait = last_draw + min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            # skip stale frames if the worker fell behind
+            stop = False
+            while True:
+                try:
+                    newer = frames.get_nowait()
+                except queue.Empty:
+                    break
+                if newer is None:
+                    stop = True
+                    break
+                frame = newer
+
+            gui.draw_frame(frame, return_frame=False)
+            last_draw = time.monotonic()
+            if stop:
+                break
+    finally:
+        gui.close()
+
+
+class RenderWorker:
+    """Draws vis.Frame snapshots with a WarehouseGui in a background thread or process.
+
+    submit() never blocks: if the bounded queue is full the oldest frame is dropped.
+    """
+
+    def __init__(
+        self,
+        grid_size,
+        max_items_in_env,
+        use_process=False,
+        max_queue=2,
+        max_fps=None,
+        offscreen=False,
+    ):
+        self.dropped_frames = 0
+        args = (grid_size, max_items_in_env, max_fps, offscreen)
+        if use_process:
+            self._frames = multiprocessing.Queue(max_queue)
+            self._worker = multiprocessing.Process(
+                target=_render_loop, args=(self._frames,) + args, daemon=True
+            )
+        else:
+            self._frames = queue.Queue(max_queue)
+            self._worker = threading.Thread(
+                target=_render_loop, args=(self._frames,) + args, daemon=True
+            )
+        self._worker.start()
+
+    def submit(self, frame):
+        try:
+            self._frames.put_nowait(frame)
+            return
+        except queue.Full:
+            pass
+        # drop the oldest frame, the worker is behind anyway
+        try:
+            self._frames.get_nowait()
+            self.dropped_frames += 1
+        except queue.Empty:
+            pass
+        try:
+            self._frames.put_nowait(frame)
+        except queue.Full:
+            self.dropped_frames += 1
+
+    def is_alive(self) -> bool:
+        return self._worker.is_alive()
+
+    def close(self, timeout=5.0):
+        if not self._worker.is_alive():
+            return
+        try:
+            self._frames.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._worker.join(timeout)
@@ -1,10 +1,14 @@
-import random
-import itertools
+import json
+import numpy as np
 from warehouse_env.item import Item
+from warehouse_env.inventory import Inventory
 from warehouse_env.constants import PICK_T, PUT_T, TRANSACTION_NAMES
 
 
 class Transaction:
+    # step the order came in, set in continuous operation
+    arrival_step = 0
+
     def to_string(self) -> str:
         return TRANSACTION_NAMES[self.get_type()] + self.info()
 
@@ -39,50 +43,209 @@ class PutTransaction(Transaction):
         return " with Items " + ", ".join(item.to_string() for item in self.items)
 
 
-def create_new_transaction(
-    max_items_in_env: int, bin_slot_size: int, bins
-) -> Transaction:
-    # ignore agent item as a new transaction should be only generated if agent has no item
-    used_slots = [
-        x for x in itertools.chain.from_iterable(b.get_used_slot_ids() for b in bins)
-    ]
-    is_put_possible = max_items_in_env - len(used_slots) > 0
-    is_pick_possible = len(used_slots) > 0
+def abc_popularity(
+    max_items_in_env: int, a_share=0.2, a_demand=0.8, b_share=0.3, b_demand=0.15
+):
+    """Popularity weights of the slot ids 1..max_items_in_env for an ABC skew.
+
+    The first a_share of the ids gets a_demand of the demand, the next b_share of
+    the ids b_demand and the remaining C ids the rest, spread evenly within a class.
+    """
+    assert a_share + b_share < 1 and a_demand + b_demand < 1
+    n_a = max(1, int(round(max_items_in_env * a_share)))
+    n_b = max(1, int(round(max_items_in_env * b_share)))
+    n_c = max_items_in_env - n_a - n_b
+    assert n_c > 0, "Too few items for three popularity classes"
+    return np.concatenate(
+        [
+            np.full(n_a, a_demand / n_a),
+            np.full(n_b, b_demand / n_b),
+            np.full(n_c, (1 - a_demand - b_demand) / n_c),
+        ]
+    )
+
 
-    if is_pick_possible and is_put_possible:
-        if bool(random.getrandbits(1)):
-            return _create_pick_transation(used_slots, bin_slot_size)
+def _freeze(state):
+    # bit generator states are nested dicts of ints and strings, make them hashable
+    if isinstance(state, dict):
+        return tuple(sorted((key, _freeze(value)) for key, value in state.items()))
+    return state
+
+
+def _thaw(state):
+    if isinstance(state, tuple):
+        return {key: _thaw(value) for key, value in state}
+    return state
+
+
+class TransactionSource:
+    """Draws the transaction of every reset, each environment owns one.
+
+    Random numbers come from a seeded np.random.Generator and are drawn for
+    batch_size transactions at once. pick_ratio is the chance of a pick when
+    both a pick and a put are possible. popularity weights the slot ids 1..n
+    (see abc_popularity): picks favour popular stored ids, puts popular free ids.
+    """
+
+    def __init__(
+        self,
+        max_items_in_env: int,
+        bin_slot_size: int,
+        seed=None,
+        pick_ratio=0.5,
+        popularity=None,
+        batch_size=64,
+    ):
+        self.max_items_in_env = max_items_in_env
+        self.bin_slot_size = bin_slot_size
+        self.pick_ratio = pick_ratio
+        self.batch_size = batch_size
+        if popularity is None:
+            popularity = np.ones(max_items_in_env)
+        popularity = np.asarray(popularity, dtype=np.float64)
+        assert popularity.shape == (max_items_in_env,) and (popularity > 0).all()
+        self.popularity = popularity
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        self.rng = np.random.Generator(np.random.PCG64(seed))
+        self._draw_batch()
+
+    def next(self, inventory: Inventory) -> Transaction:
+        if self._index == self.batch_size:
+            self._draw_batch()
+        i = self._index
+        self._index += 1
+
+        is_put_possible = inventory.count_free() > 0
+        is_pick_possible = inventory.count_used() > 0
+        if is_pick_possible and is_put_possible:
+            is_pick = self._kind[i] < self.pick_ratio
+        elif is_pick_possible or is_put_possible:
+            is_pick = is_pick_possible
         else:
-            return _create_put_transaction(
-                used_slots, max_items_in_env, bin_slot_size
-            )
-    elif is_pick_possible:
-        return _create_pick_transation(used_slots, bin_slot_size)
-    elif is_put_possible:
-        return _create_put_transaction(
-            used_slots, max_items_in_env, bin_slot_size
-        )
-    else:
-        raise AssertionError("Either pick or put transaction must be creatable")
-
-
-def _create_pick_transation(used_slots: int, bin_slot_size: int) -> Transaction:
-    number_of_picks = random.randint(1, min(bin_slot_size, len(used_slots)))
-    pick_up_ids = random.sample(used_slots, number_of_picks)
-    return PickTransaction([item_id for item_id in pick_up_ids])
-
-
-def _create_put_transaction(
-    used_slots: int, max_items_in_env: int, bin_slot_size: int
-) -> Transaction:
-    number_of_picks = random.randint(
-        1, min(bin_slot_size, max_items_in_env - len(used_slots))
-    )
-    # items must not be zero based!
-    free_ids = [
-        item_id + 1
-        for item_id in range(max_items_in_env)
-        if (item_id + 1) not in used_slots
-    ]
-    pick_up_ids = random.sample(free_ids, number_of_picks)
-    return PutTransaction([Item(item_id) for item_id in pick_up_ids])
+            raise AssertionError("Either pick or put transaction must be creatable")
+
+        ids = inventory.used_slot_ids() if is_pick else inventory.free_slot_ids()
+        candidates = np.array(ids)
+        count = 1 + int(self._size[i] * min(self.bin_slot_size, len(candidates)))
+        # weighted sampling without replacement: the count smallest exponential keys
+        keys = self._keys[i, candidates - 1]
+        if count < len(candidates):
+            smallest = np.argpartition(keys, count - 1)[:count]
+        else:
+            smallest = np.arange(len(candidates))
+        slot_ids = [int(s) for s in candidates[smallest[np.argsort(keys[smallest])]]]
+        if is_pick:
+            return PickTransaction(slot_ids)
+        return PutTransaction([Item(slot) for slot in slot_ids])
+
+    def get_state(self):
+        # hashable, the batch is drawn again from its start state if needed
+        return self._start, self._index
+
+    def set_state(self, state):
+        start, index = state
+        if start != self._start:
+            self.rng.bit_generator.state = _thaw(start)
+            self._draw_batch()
+        self._index = index
+
+    def _draw_batch(self):
+        self._start = _freeze(self.rng.bit_generator.state)
+        self._kind = self.rng.random(self.batch_size)
+        self._size = self.rng.random(self.batch_size)
+        self._keys = self.rng.standard_exponential(
+            (self.batch_size, self.max_items_in_env), dtype=np.float32
+        ) / self.popularity.astype(np.float32)
+        self._index = 0
+
+
+class TraceSource:
+    """Replays the transactions of a trace file written by write_trace, in order.
+
+    Episodes cut short by reset(assertions=False) drop carried and staged items, so
+    a trace entry can ask for ids that are not stored (pick) or not free (put). Those
+    ids are left out, an entry without any feasible id is skipped and counted in
+    skipped, the ids left out of the other entries in dropped_ids. With loop=True
+    the trace starts over at its end.
+    """
+
+    def __init__(self, path, loop=False):
+        self.path = path
+        self.loop = loop
+        self.transactions = read_trace(path)
+        self._index = 0
+        self.skipped = 0
+        self.dropped_ids = 0
+
+    def seed(self, seed=None):
+        # a trace has no randomness, seeding starts it over
+        self._index = 0
+
+    def next(self, inventory: Inventory) -> Transaction:
+        # at most one pass over the trace, looking for an entry with a feasible id
+        for _ in range(len(self.transactions)):
+            if self._index == len(self.transactions):
+                assert self.loop, "Trace " + self.path + " is exhausted"
+                self._index = 0
+            kind, slot_ids = self.transactions[self._index]
+            self._index += 1
+
+            if kind == PICK_T:
+                feasible = [slot for slot in slot_ids if inventory.is_stored(slot)]
+            else:
+                feasible = [slot for slot in slot_ids if inventory.is_free(slot)]
+            if not feasible:
+                self.skipped += 1
+                continue
+            self.dropped_ids += len(slot_ids) - len(feasible)
+            if kind == PICK_T:
+                return PickTransaction(feasible)
+            return PutTransaction([Item(slot) for slot in feasible])
+        raise AssertionError("No entry of trace " + self.path + " is feasible")
+
+    def get_state(self):
+        return self._index
+
+    def set_state(self, state):
+        self._index = state
+
+
+def write_trace(path, transactions):
+    """One JSON object per line, {"type": "pick" or "put", "slots": [slot ids]}"""
+    with open(path, "w") as f:
+        for t in transactions:
+            if t.get_type() == PICK_T:
+                slot_ids = t.slot_ids
+            else:
+                slot_ids = [item.slot for item in t.items]
+            kind = TRANSACTION_NAMES[t.get_type()].lower()
+            f.write(json.dumps({"type": kind, "slots": [int(s) for s in slot_ids]}) + "\n")
+
+
+def read_trace(path):
+    # list of (PICK_T or PUT_T, slot ids)
+    types = {name.lower(): t for t, name in TRANSACTION_NAMES.items()}
+    with open(path, "r") as f:
+        return [
+            (types[entry["type"]], tuple(entry["slots"]))
+            for entry in (json.loads(line) for line in f if line.strip())
+        ]
+
+
+def generate_trace(path, source, n_transactions):
+    """Writes n_transactions of a source to a trace, as if every transaction got completed"""
+    inventory = Inventory(source.max_items_in_env)
+    transactions = []
+    for _ in range(n_transactions):
+        t = source.next(inventory)
+        if t.get_type() == PICK_T:
+            for slot in t.slot_ids:
+                inventory.release(slot)
+        else:
+            for item in t.items:
+                # any value marks the id as stored, there are no bins here
+                inventory.store(item.slot, True)
+        transactions.append(t)
+    write_trace(path, transactions)
@@ -0,0 +1,324 @@
+import numpy as np
+from gym import spaces
+from warehouse_env.layout import compile_layout, NO_CONTAINER
+from warehouse_env.constants import (
+    MOVE_UP,
+    MOVE_DOWN,
+    MOVE_LEFT,
+    MOVE_RIGHT,
+    PICK_T,
+    PUT_T,
+    INVALID_ACTION,
+    GOOD_ACTION,
+)
+
+_MOVE_DELTAS = np.zeros((4, 2), dtype=np.int64)
+_MOVE_DELTAS[MOVE_UP] = [-1, 0]
+_MOVE_DELTAS[MOVE_DOWN] = [1, 0]
+_MOVE_DELTAS[MOVE_LEFT] = [0, -1]
+_MOVE_DELTAS[MOVE_RIGHT] = [0, 1]
+
+
+class WarehouseVecEnv:
+    """N copies of one layout stepped together, same dynamics and rewards as WarehouseEnv.
+
+    The state of all warehouses is kept as arrays indexed [env] or [env, slot id],
+    slot ids are 1-based so column 0 of the slot arrays is never used.
+    Finished environments are reset automatically, the last observation of the
+    finished episode is passed in info["terminal_observation"], info["action_mask"]
+    holds the action mask of the env (see action_masks).
+    """
+
+    def __init__(self, layout_path="layout.yml", num_envs=1, seed=None, layout_cache=True):
+        self.compiled = compile_layout(layout_path, use_cache=layout_cache)
+        self.layout = self.compiled.layout
+        self.num_envs = num_envs
+        self.rng = np.random.default_rng(seed)
+
+        self.n_bins = self.compiled.n_bins
+        self.bin_slot_size = self.compiled.bin_slot_size
+        self.max_items_in_env = self.compiled.max_items_in_env
+        self.load_offset = 4
+        self.unload_offset = 4 + self.max_items_in_env
+
+        self.action_space = spaces.Discrete(4 + 2 * self.max_items_in_env)
+        self.n_channels = 3 + self.max_items_in_env * 2
+        self.shape = (self.compiled.height, self.compiled.width, self.n_channels)
+        self.observation_space = spaces.Box(
+            low=-1, high=1, shape=self.shape, dtype=np.uint8
+        )
+
+        # blocked grid with a blocked border, so moves off the grid need no bounds check
+        self._blocked = np.ones(
+            (self.compiled.height + 2, self.compiled.width + 2), dtype=bool
+        )
+        self._blocked[1:-1, 1:-1] = self.compiled.blocked
+
+        self._static_state = self.compiled.static_state
+
+        # loading cells per container padded to the same length for batched scatter
+        cells = [
+            self.compiled.container_cells(i) for i in range(self.n_bins + 2)
+        ]
+        width = max(len(c) for c in cells)
+        self._cells = np.zeros((self.n_bins + 2, width, 2), dtype=np.int64)
+        self._cells_valid = np.zeros((self.n_bins + 2, width), dtype=bool)
+        for i, c in enumerate(cells):
+            self._cells[i, : len(c)] = c
+            self._cells_valid[i, : len(c)] = True
+        self._bin_cells = np.concatenate(cells[: self.n_bins])
+        self._staging_out_cells = cells[self.compiled.staging_out]
+
+        n, m = self.num_envs, self.max_items_in_env + 1
+        start = self.layout["agent-start"]["position"]
+        self.agent_pos = np.tile(np.array(start, dtype=np.int64), (n, 1))
+        self.loaded_slot = np.zeros(n, dtype=np.int64)
+        # bin index or staging in index holding a slot id, NO_CONTAINER otherwise
+        self.slot_location = np.full((n, m), NO_CONTAINER, dtype=np.int64)
+        self.incoming = np.zeros((n, m), dtype=bool)
+        self.put_items = np.zeros((n, m), dtype=bool)
+        self.place_rewarded = np.zeros((n, m), dtype=bool)
+        self.transaction_type = np.zeros(n, dtype=np.int64)
+        self.transaction_size = np.zeros(n, dtype=np.int64)
+
+        self.item_counter = np.zeros(n, dtype=np.int64)
+        self.invalid_action_counter = np.zeros(n, dtype=np.int64)
+        self._actions = None
+
+    def reset(self, return_info=False):
+        self.invalid_action_counter[:] = 0
+        self._reset_envs(np.arange(self.num_envs))
+        obs = self._observe(np.arange(self.num_envs))
+        if return_info:
+            return obs, [{"action_mask": mask} for mask in self.action_masks()]
+        return obs
+
+    def action_masks(self):
+        """[env, action] masks, False for the actions step would answer with INVALID_ACTION"""
+        n = self.num_envs
+        rows = np.arange(n)
+        r, c = self.agent_pos[:, 0], self.agent_pos[:, 1]
+        masks = np.zeros((n, self.action_space.n), dtype=bool)
+        masks[:, : self.load_offset] = self.compiled.move_mask[r, c]
+
+        at = self.compiled.loading_index[r, c]
+        empty = self.loaded_slot == 0
+        masks[:, self.load_offset : self.unload_offset] = (
+            empty & (at != NO_CONTAINER)
+        )[:, None] & (self.slot_location[:, 1:] == at[:, None])
+        # only the carried item can be unloaded, to a bin with free capacity or to
+        # staging out if it is incoming
+        loaded = self.loaded_slot
+        to_bin = (
+            ~empty
+            & (at >= 0)
+            & (at < self.n_bins)
+            & (self._bin_counts(rows, at) < self.bin_slot_size)
+        )
+        to_out = (
+            ~empty & (at == self.compiled.staging_out) & self.incoming[rows, loaded]
+        )
+        unload = to_bin | to_out
+        masks[rows[unload], self.unload_offset + loaded[unload] - 1] = True
+        return masks
+
+    def step_async(self, actions):
+        self._actions = actions
+
+    def step_wait(self):
+        return self.step(self._actions)
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+        if ((actions < 0) | (actions >= self.action_space.n)).any():
+            raise AssertionError("Invalid action Type.")
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+
+        # Moves
+        envs = np.nonzero(actions < self.load_offset)[0]
+        target = self.agent_pos[envs] + _MOVE_DELTAS[actions[envs]]
+        valid = ~self._blocked[target[:, 0] + 1, target[:, 1] + 1]
+        self.agent_pos[envs[valid]] = target[valid]
+        rewards[envs[~valid]] = INVALID_ACTION
+
+        container = self.compiled.loading_index[
+            self.agent_pos[:, 0], self.agent_pos[:, 1]
+        ]
+
+        # Loads from bins and staging in
+        envs = np.nonzero(
+            (actions >= self.load_offset) & (actions < self.unload_offset)
+        )[0]
+        slots = actions[envs] - self.load_offset + 1
+        at = container[envs]
+        valid = (
+            (self.loaded_slot[envs] == 0)
+            & (at != NO_CONTAINER)
+            & (self.slot_location[envs, slots] == at)
+        )
+        self.slot_location[envs[valid], slots[valid]] = NO_CONTAINER
+        self.loaded_slot[envs[valid]] = slots[valid]
+        rewards[envs[valid & (at == self.compiled.staging_in)]] = GOOD_ACTION
+        rewards[envs[~valid]] = INVALID_ACTION
+
+        # Unloads to bins and staging out
+        envs = np.nonzero(actions >= self.unload_offset)[0]
+        slots = actions[envs] - self.unload_offset + 1
+        at = container[envs]
+        loaded = self.loaded_slot[envs]
+        to_bin = (
+            (loaded != 0)
+            & (at >= 0)
+            & (at < self.n_bins)
+            & (slots == loaded)
+            & (self._bin_counts(envs, at) < self.bin_slot_size)
+        )
+        to_out = (
+            (loaded != 0)
+            & (at == self.compiled.staging_out)
+            & (slots == loaded)
+            & self.incoming[envs, slots]
+        )
+
+        placed, placed_slots = envs[to_bin], slots[to_bin]
+        self.slot_location[placed, placed_slots] = at[to_bin]
+        first = (
+            self.put_items[placed, placed_slots]
+            & ~self.place_rewarded[placed, placed_slots]
+        )
+        self.place_rewarded[placed[first], placed_slots[first]] = True
+        rewards[placed[first]] = GOOD_ACTION
+
+        self.incoming[envs[to_out], slots[to_out]] = False
+        rewards[envs[to_out]] = GOOD_ACTION
+
+        self.loaded_slot[envs[to_bin | to_out]] = 0
+        rewards[envs[~(to_bin | to_out)]] = INVALID_ACTION
+
+        self.invalid_action_counter += rewards < 0
+
+        # Episode end, same checks as StagingIn/StagingOut.is_current_transaction_done
+        stored = (self.slot_location >= 0) & (self.slot_location < self.n_bins)
+        put_done = ~(self.put_items & ~stored).any(axis=1)
+        pick_done = ~self.incoming.any(axis=1)
+        dones = np.where(self.transaction_type == PICK_T, pick_done, put_done)
+        self.item_counter[dones] += self.transaction_size[dones]
+
+        obs = self._observe(np.arange(self.num_envs))
+        infos = [{} for _ in range(self.num_envs)]
+        done_envs = np.nonzero(dones)[0]
+        if len(done_envs) > 0:
+            for i in done_envs:
+                infos[i]["terminal_observation"] = obs[i].copy()
+            self.invalid_action_counter[done_envs] = 0
+            self._reset_envs(done_envs)
+            obs[done_envs] = self._observe(done_envs)
+        for info, mask in zip(infos, self.action_masks()):
+            info["action_mask"] = mask
+        return obs, rewards, dones, infos
+
+    def close(self):
+        pass
+
+    def _reset_envs(self, envs):
+        # same as WarehouseEnv.reset(assertions=False)
+        self.loaded_slot[envs] = 0
+        location = self.slot_location[envs]
+        location[location == self.compiled.staging_in] = NO_CONTAINER
+        self.slot_location[envs] = location
+        self.incoming[envs] = False
+        self.put_items[envs] = False
+        self._create_transactions(envs)
+
+    def _create_transactions(self, envs):
+        n, m = len(envs), self.max_items_in_env
+        location = self.slot_location[envs, 1:]
+        stored = (location >= 0) & (location < self.n_bins)
+        used = stored.sum(axis=1)
+        is_pick_possible = used > 0
+        is_put_possible = used < m
+        assert (is_pick_possible | is_put_possible).all()
+        is_pick = np.where(
+            is_pick_possible & is_put_possible,
+            self.rng.random(n) < 0.5,
+            is_pick_possible,
+        )
+
+        # sample count distinct slot ids per env by ranking random keys
+        candidates = np.where(is_pick[:, None], stored, ~stored)
+        counts = 1 + (
+            self.rng.random(n)
+            * np.minimum(self.bin_slot_size, candidates.sum(axis=1))
+        ).astype(np.int64)
+        keys = self.rng.random((n, m))
+        keys[~candidates] = 2.0
+        ranks = np.argsort(np.argsort(keys, axis=1), axis=1)
+        chosen = candidates & (ranks < counts[:, None])
+
+        picks, puts = envs[is_pick], envs[~is_pick]
+        self.incoming[picks, 1:] = chosen[is_pick]
+        put_chosen = chosen[~is_pick]
+        self.put_items[puts, 1:] = put_chosen
+        location = self.slot_location[puts, 1:]
+        location[put_chosen] = self.compiled.staging_in
+        self.slot_location[puts, 1:] = location
+        rewarded = self.place_rewarded[puts, 1:]
+        rewarded[put_chosen] = False
+        self.place_rewarded[puts, 1:] = rewarded
+
+        self.transaction_type[envs] = np.where(is_pick, PICK_T, PUT_T)
+        self.transaction_size[envs] = counts
+
+    def _bin_counts(self, envs, containers):
+        # number of items in container containers[i] of env envs[i]
+        return (self.slot_location[envs] == containers[:, None]).sum(axis=1)
+
+    def _observe(self, envs):
+        m = self.max_items_in_env
+        obs = np.empty((len(envs),) + self.shape, dtype=np.int8)
+        obs[:] = self._static_state
+        rows = np.arange(len(envs))
+
+        # Agent Position and Slot
+        pos = self.agent_pos[envs]
+        loaded = self.loaded_slot[envs]
+        obs[rows, pos[:, 0], pos[:, 1], 1] = 1
+        carrying = loaded > 0
+        obs[rows[carrying], pos[carrying, 0], pos[carrying, 1], 1 + loaded[carrying]] = 1
+
+        # Bins and Staging In
+        env_i, slot_i = np.nonzero(self.slot_location[envs] >= 0)
+        location = self.slot_location[envs][env_i, slot_i]
+        for j in range(self._cells.shape[1]):
+            valid = self._cells_valid[location, j]
+            cells = self._cells[location[valid], j]
+            obs[env_i[valid], cells[:, 0], cells[:, 1], m + 1 + slot_i[valid]] = 1
+
+        # Full Bins
+        counts = np.zeros((len(envs), self.n_bins), dtype=np.int64)
+        in_bins = location < self.n_bins
+        np.add.at(counts, (env_i[in_bins], location[in_bins]), 1)
+        env_i, bin_i = np.nonzero(counts >= self.bin_slot_size)
+        for j in range(self._cells.shape[1]):
+            valid = self._cells_valid[bin_i, j]
+            cells = self._cells[bin_i[valid], j]
+            obs[env_i[valid], cells[:, 0], cells[:, 1], self.compiled.full_channel] = 1
+
+        # Put transaction items are marked at every bin
+        env_i, slot_i = np.nonzero(self.put_items[envs])
+        obs[
+            env_i[:, None],
+            self._bin_cells[None, :, 0],
+            self._bin_cells[None, :, 1],
+            (m + 1 + slot_i)[:, None],
+        ] = -1
+
+        # Staging Out
+        env_i, slot_i = np.nonzero(self.incoming[envs])
+        obs[
+            env_i[:, None],
+            self._staging_out_cells[None, :, 0],
+            self._staging_out_cells[None, :, 1],
+            (m + 1 + slot_i)[:, None],
+        ] = -1
+        return obs
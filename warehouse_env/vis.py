@@ -1,3 +1,5 @@
+import os
+from collections import namedtuple
 import numpy as np
 import pygame
 
@@ -8,116 +10,228 @@ BLACK = (0, 0, 0)
 BIN = (139, 69, 16)
 ITEM = (200, 80, 40)
 
+MAX_GLYPHS = 4096
+
+IMG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img")
+
+# Everything the gui draws, as plain tuples of ints: agents are ((row, col), loaded slot id
+# or None), bins and staging_in are ((row, col), slot ids), staging_out is ((row, col), incoming ids)
+Frame = namedtuple("Frame", ["agents", "bins", "staging_in", "staging_out", "text"])
+
+
+def make_frame(agents, bins, staging_in, staging_out, transaction) -> Frame:
+    return Frame(
+        tuple(
+            (
+                tuple(agent.agent_pos),
+                agent.loaded_item.slot if agent.loaded_item is not None else None,
+            )
+            for agent in agents
+        ),
+        tuple((tuple(b.pos), tuple(b.get_slots().keys())) for b in bins),
+        (tuple(staging_in.pos), tuple(staging_in.get_slots().keys())),
+        (tuple(staging_out.pos), tuple(staging_out.incoming)),
+        transaction.to_string() if transaction is not None else "",
+    )
+
 
 class WarehouseGui:
-    def __init__(self, grid_size, max_items_in_env):
+    def __init__(self, grid_size, max_items_in_env, offscreen=False):
         self.scale = GUI_SCALING
         self.warehouse_display_size = self.scale * np.array(grid_size)
-
-        pygame.init()
-
-        self.screen = pygame.display.set_mode(
-            (self.warehouse_display_size[1], self.warehouse_display_size[0] + 30)
-        )
+        self.offscreen = offscreen
+        screen_size = (self.warehouse_display_size[1], self.warehouse_display_size[0] + 30)
+
+        if self.offscreen:
+            # draw to a plain surface, no display (and no window) is needed
+            pygame.font.init()
+            self.screen = pygame.Surface(screen_size)
+        else:
+            pygame.init()
+            self.screen = pygame.display.set_mode(screen_size)
+            pygame.display.set_caption("Chaotic Warehouse")
         self.basic_font = pygame.font.Font("freesansbold.ttf", 18)
         self.item_size = self.scale / max_items_in_env
-        pygame.display.set_caption("Chaotic Warehouse")
+
+        # sprites and text are rendered once and reused by every frame
+        self.agent_picture = pygame.transform.scale(
+            pygame.image.load(os.path.join(IMG_DIR, "agent.png")),
+            (self.scale, self.scale),
+        )
+        self.item_picture = pygame.transform.scale(
+            pygame.image.load(os.path.join(IMG_DIR, "item.png")),
+            (int(self.scale / 2), int(self.scale / 2)),
+        )
+        self._glyphs = {}
+
+        # static background incl. the bins, made on the first frame
+        self.background = pygame.Surface(screen_size)
         self._make_background()
-        pygame.display.update()
+        self._background_done = False
+        self._cells = {}
+        self._text = None
+
+        self.screen.blit(self.background, (0, 0))
+        if not self.offscreen:
+            pygame.display.update()
 
     def close(self):
-        pygame.display.quit()
-        pygame.quit()
+        if not self.offscreen:
+            pygame.display.quit()
+            pygame.quit()
 
     def _make_background(self):
-        self.screen.fill(WHITE)
+        self.background.fill(WHITE)
         pygame.draw.rect(
-            self.screen,
+            self.background,
             GRAY,
             pygame.Rect(
                 0, self.warehouse_display_size[0], self.warehouse_display_size[1], 30
             ),
         )
 
-    def frame_step(self, agent, bins, staging_in, staging_out, transaction):
-        pygame.event.get()
-        self._make_background()
-        self._draw_agent(agent)
-        for b in bins:
-            self._draw_bins(b)
-        self._draw_bins(staging_in)
-        self._draw_bins(staging_out, use_slots=False)
-        self._draw_incoming(staging_out)
-        self._print_text(transaction.to_string(), 0, self.warehouse_display_size[0])
-
-        pygame.display.update()
+    def frame_step(
+        self, agents, bins, staging_in, staging_out, transaction, return_frame=True
+    ):
+        return self.draw_frame(
+            make_frame(agents, bins, staging_in, staging_out, transaction), return_frame
+        )
 
-        image_data = pygame.surfarray.array3d(pygame.display.get_surface())
-        return image_data
+    def handle_events(self):
+        if not self.offscreen:
+            pygame.event.get()
+
+    def draw_frame(self, frame: Frame, return_frame=True):
+        self.handle_events()
+        if not self._background_done:
+            self._draw_static(frame)
+
+        # only cells whose content differs from the last frame are redrawn
+        cells = self._frame_cells(frame)
+        dirty = []
+        for cell in set(cells) | set(self._cells):
+            content = cells.get(cell)
+            if content == self._cells.get(cell):
+                continue
+            rect = self._cell_rect(cell)
+            self.screen.blit(self.background, rect, rect)
+            self.screen.set_clip(rect)
+            if content is not None:
+                self._draw_cell(cell, content)
+            self.screen.set_clip(None)
+            dirty.append(rect)
+        self._cells = cells
+
+        if frame.text != self._text:
+            rect = pygame.Rect(
+                0, self.warehouse_display_size[0], self.warehouse_display_size[1], 30
+            )
+            self.screen.blit(self.background, rect, rect)
+            self._print_text(frame.text, 0, self.warehouse_display_size[0])
+            self._text = frame.text
+            dirty.append(rect)
+
+        if not self.offscreen and dirty:
+            pygame.display.update(dirty)
+
+        if return_frame:
+            return pygame.surfarray.array3d(self.screen)
+        return None
+
+    def draw_image(self, image):
+        # image as returned by WarehouseEnv.render("rgb_array"), [height, width, rgb]
+        self.handle_events()
+        pygame.surfarray.blit_array(self.screen, np.transpose(image, (1, 0, 2)))
+        # the screen no longer matches the cached cells, redraw all on the next frame
+        self._background_done = False
+        self._text = None
+        if not self.offscreen:
+            pygame.display.update()
+
+    def _draw_static(self, frame):
+        for pos, _ in frame.bins + (frame.staging_in, frame.staging_out):
+            pygame.draw.rect(self.background, BIN, self._cell_rect(pos))
+        self.screen.blit(self.background, (0, 0))
+        self._cells = {}
+        self._background_done = True
+        if not self.offscreen:
+            pygame.display.update()
 
     @staticmethod
-    def _make_text_objects(text, font, color):
-        surf = font.render(text, True, color)
+    def _frame_cells(frame):
+        cells = {pos: ("agent", loaded_slot) for pos, loaded_slot in frame.agents}
+        for pos, slots in frame.bins + (frame.staging_in,):
+            if slots:
+                cells[pos] = ("bin", slots)
+        pos, incoming = frame.staging_out
+        if incoming:
+            cells[pos] = ("incoming", incoming)
+        return cells
+
+    def _cell_rect(self, pos):
+        # needs to be flipped for pygame coordinates
+        return pygame.Rect(pos[1] * self.scale, pos[0] * self.scale, self.scale, self.scale)
+
+    def _draw_cell(self, pos, content):
+        kind, value = content
+        if kind == "agent":
+            self._draw_agent(pos, value)
+        elif kind == "bin":
+            self._draw_bin_slots(pos, value)
+        else:
+            self._draw_incoming(pos, value)
+
+    def _make_text_objects(self, text, font, color):
+        surf = self._glyphs.get(text)
+        if surf is None:
+            if len(self._glyphs) >= MAX_GLYPHS:
+                # transaction texts are mostly unique, don't let them pile up
+                self._glyphs.clear()
+            surf = font.render(text, True, color)
+            self._glyphs[text] = surf
         return surf, surf.get_rect()
 
-    def _draw_agent(self, agent):
-        agent_picture = pygame.image.load("warehouse_env/img/agent.png")
-        agent_picture = pygame.transform.scale(agent_picture, (self.scale, self.scale))
-        agent_rectangle = agent_picture.get_rect()
-        agent_rectangle = agent_rectangle.move(
-            (agent.agent_pos[1] * self.scale, agent.agent_pos[0] * self.scale)
+    def _draw_agent(self, pos, loaded_slot):
+        agent_rectangle = self.agent_picture.get_rect().move(
+            (pos[1] * self.scale, pos[0] * self.scale)
         )  # needs to be flipped for pygame coordinates
-        self.screen.blit(agent_picture, agent_rectangle)
-        if agent.loaded_item is not None:
-            left = agent.agent_pos[1] * self.scale + int(self.scale / 2)
-            top = agent.agent_pos[0] * self.scale + int(self.scale / 2)
-            ws_pic = pygame.image.load("warehouse_env/img/item.png")
-            ws_pic = pygame.transform.scale(
-                ws_pic, (int(self.scale / 2), int(self.scale / 2))
-            )
-            ws_rectangle = ws_pic.get_rect()
-            ws_rectangle = ws_rectangle.move(
+        self.screen.blit(self.agent_picture, agent_rectangle)
+        if loaded_slot is not None:
+            left = pos[1] * self.scale + int(self.scale / 2)
+            top = pos[0] * self.scale + int(self.scale / 2)
+            ws_rectangle = self.item_picture.get_rect().move(
                 (left, top)
             )  # needs to be flipped for pygame coordinates
-            self.screen.blit(ws_pic, ws_rectangle)
+            self.screen.blit(self.item_picture, ws_rectangle)
 
-            self._print_text(agent.loaded_item.slot, left, top)
+            self._print_text(loaded_slot, left, top)
 
-    def _draw_bins(self, bin, use_slots=True):
-        pygame.draw.rect(
-            self.screen,
-            BIN,
-            pygame.Rect(
-                bin.pos[1] * self.scale, bin.pos[0] * self.scale, self.scale, self.scale
-            ),
-        )
-        if use_slots:  # staging out is block to get slots, just skip
-            index = 1
-            for item in bin.get_slots().values():
-                left = bin.pos[1] * self.scale + 0.1 * self.scale
-                top = bin.pos[0] * self.scale + self.scale - self.item_size * index
-                pygame.draw.rect(
-                    self.screen,
-                    ITEM,
-                    pygame.Rect(
-                        left,
-                        top,
-                        self.scale - 0.2 * self.scale,
-                        self.item_size - 0.1 * self.scale,
-                    ),
-                )
-                index += 1
-
-                self._print_text(item.slot, left, top)
-
-    def _draw_incoming(self, staging_out):
-        left = staging_out.pos[1] * self.scale + 0.1 * self.scale
+    def _draw_bin_slots(self, pos, slots):
         index = 1
-        for item_id in staging_out.incoming:
-            top = staging_out.pos[0] * self.scale + self.scale - self.item_size * index
-            self._print_text("->"+str(item_id), left, top)
+        for slot in slots:
+            left = pos[1] * self.scale + 0.1 * self.scale
+            top = pos[0] * self.scale + self.scale - self.item_size * index
+            pygame.draw.rect(
+                self.screen,
+                ITEM,
+                pygame.Rect(
+                    left,
+                    top,
+                    self.scale - 0.2 * self.scale,
+                    self.item_size - 0.1 * self.scale,
+                ),
+            )
             index += 1
 
+            self._print_text(slot, left, top)
+
+    def _draw_incoming(self, pos, incoming):
+        left = pos[1] * self.scale + 0.1 * self.scale
+        index = 1
+        for item_id in incoming:
+            top = pos[0] * self.scale + self.scale - self.item_size * index
+            self._print_text("->" + str(item_id), left, top)
+            index += 1
 
     def _print_text(self, text, left, top):
         item_id_text, item_id_rectangle = self._make_text_objects(
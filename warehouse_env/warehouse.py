@@ -2,13 +2,23 @@ import gym
 from gym import spaces
 import numpy as np
 import math
-import yaml
 import random
 import itertools
+import operator
 import time
-from warehouse_env.transaction import create_new_transaction
+from collections import namedtuple
+from warehouse_env.transaction import (
+    TransactionSource,
+    PickTransaction,
+    PutTransaction,
+)
+from warehouse_env.item import Item
 from warehouse_env.agent import Agent
 from warehouse_env.bins import Bin, StagingIn, StagingOut
+from warehouse_env.layout import compile_layout, NO_CONTAINER
+from warehouse_env.inventory import Inventory
+from warehouse_env.profiling import StepProfiler
+from warehouse_env import encoding
 from warehouse_env.constants import (
     MOVE_UP,
     MOVE_DOWN,
@@ -17,27 +27,69 @@ from warehouse_env.constants import (
     PICK_T,
     PUT_T,
 )
-from warehouse_env.vis import WarehouseGui
+
+# Snapshot of WarehouseEnv.get_state, only tuples of ints so it is immutable and hashable:
+# agents are (row, col, loaded slot id or 0), bins and staging_in hold slot ids in insertion
+# order, transaction is (PICK_T or PUT_T, slot ids) or None, placed and removed are the slot
+# ids of the transaction whose item had its first place/remove reward, counters are
+# (item_counter, invalid_action_counter) and rng is the state of the transaction source
+WarehouseState = namedtuple(
+    "WarehouseState",
+    [
+        "agents",
+        "bins",
+        "staging_in",
+        "incoming",
+        "transaction",
+        "placed",
+        "removed",
+        "counters",
+        "rng",
+    ],
+)
 
 
 class WarehouseEnv(gym.Env):
     """Custom Environment that follows gym interface"""
 
-    metadata = {"render.modes": ["human"]}
-
-    def __init__(self, layout_path="layout.yml"):
+    metadata = {"render.modes": ["human", "rgb_array"]}
+
+    def __init__(
+        self,
+        layout_path="layout.yml",
+        render_mode=None,
+        debug_checks=False,
+        render_worker=None,
+        render_fps=None,
+        verbose=True,
+        layout_cache=True,
+        observation_mode="tensor",
+        transaction_source=None,
+        profile=False,
+    ):
         # Define action and observation space
         super(WarehouseEnv, self).__init__()
         # They must be gym.spaces objects    # Example when using discrete actions:
         # Example for using image as input:
 
+        assert render_mode is None or render_mode in self.metadata["render.modes"]
+        self.render_mode = render_mode
+        # "thread" or "process": human rendering is handed to a RenderWorker
+        assert render_worker in (None, "thread", "process")
+        self.render_worker = render_worker
+        self.render_fps = render_fps
+        # compare the incrementally patched observation against a full rebuild
+        self.debug_checks = debug_checks
+        self.verbose = verbose
+        # see warehouse_env.encoding, expand_observation() turns any mode into the tensor
+        assert observation_mode in encoding.OBSERVATION_MODES
+        self.observation_mode = observation_mode
+
         self.actions = [MOVE_LEFT, MOVE_DOWN, MOVE_RIGHT, MOVE_UP]
 
-        with open(layout_path, "r") as f:
-            try:
-                self.layout = yaml.safe_load(f)
-            except yaml.YAMLError as exc:
-                print(exc)
+        # blocked grid, loading cell index and static planes, also checks the layout rules
+        self.compiled_layout = compile_layout(layout_path, use_cache=layout_cache)
+        self.layout = self.compiled_layout.layout
 
         self.max_items_in_env = self.layout["bin-slot-size"] * len(self.layout["bins"])
 
@@ -58,10 +110,9 @@ class WarehouseEnv(gym.Env):
 
         self.n_channels = 3 + self.max_items_in_env * 2
         self.shape = (self.layout["height"], self.layout["width"], self.n_channels)
-        self.observation_space = spaces.Box(
-            low=-1, high=1, shape=self.shape, dtype=np.uint8
-        )
 
+        # which bin holds each slot id, shared by all bins
+        self.inventory = Inventory(self.max_items_in_env)
         self.bins = self._create_bins(self.layout["bins"], self.layout["bin-slot-size"])
         self.staging_in = StagingIn(
             self.layout["staging-in"]["position"], self.layout["staging-in"]["loading"]
@@ -76,46 +127,105 @@ class WarehouseEnv(gym.Env):
             self.blocked_positions.append(b.pos)
         self.blocked_positions.append(self.staging_in.pos)
         self.blocked_positions.append(self.staging_out.pos)
-
-        self.agent = Agent(
-            self.layout["agent-start"]["position"],
-            self.layout["height"],
-            self.layout["width"],
-            self.layout["bin-slot-size"],
-            self.blocked_positions,
+        # same order as the container indices of the compiled layout
+        self.containers = self.bins + [self.staging_in, self.staging_out]
+
+        self.agents = [
+            Agent(
+                pos,
+                self.layout["height"],
+                self.layout["width"],
+                self.layout["bin-slot-size"],
+                self.compiled_layout.blocked,
+                self.compiled_layout.loading_index,
+                verbose=verbose,
+            )
+            for pos in self._agent_starts()
+        ]
+        self.agent = self.agents[0]
+        self.observation_space = encoding.observation_space(
+            self.observation_mode, self.compiled_layout, n_agents=len(self.agents)
         )
 
         self.transaction = None
+        self._put_slots = set()
+        # TransactionSource or TraceSource, by default seeded from the global random
+        # module so random.seed() keeps runs reproducible
+        if transaction_source is None:
+            transaction_source = TransactionSource(
+                self.max_items_in_env,
+                self.layout["bin-slot-size"],
+                seed=random.getrandbits(64),
+            )
+        self.transaction_source = transaction_source
+        # one Item per slot id, reused by set_state
+        self._items = [None] + [Item(slot) for slot in range(1, self.max_items_in_env + 1)]
+        # [container, slot id] -> the slot can be loaded from (or delivered to staging out)
+        # there, kept up to date with the observation by _patch_slot for the action mask;
+        # containers are looked up by position, which survives copying the env
+        self._container_index = {c.pos: i for i, c in enumerate(self.containers)}
+        self._contents = np.zeros(
+            (len(self.containers), self.max_items_in_env + 1), dtype=bool
+        )
+        # free places and slot ids of every bin, also kept up to date by _patch_slot,
+        # the slot id tuples are the bins of get_state
+        self._free_capacity = np.zeros(len(self.bins), dtype=np.int64)
+        self._bin_slots = []
+        # the 16 combinations of valid moves as full masks, indexed by a per-cell code
+        move_mask = self.compiled_layout.move_mask
+        self._move_code = (move_mask * np.array([1, 2, 4, 8])).sum(axis=2)
+        self._move_rows = np.zeros((16, len(self.actions)), dtype=bool)
+        self._move_rows[:, :4] = (np.arange(16)[:, None] >> np.arange(4)) & 1
+
+        self._static_state = self._build_static_state()
+        self._set_state(self._build_state())
 
         self.item_counter = 0
         self.invalid_action_counter = 0
 
-        self.gui = WarehouseGui([self.layout["height"], self.layout["width"]], self.max_items_in_env)
+        # created on the first render() call, so headless envs never touch pygame
+        self.gui = None
+        self._worker = None
+
+        # see enable_profiling, _profiler is the profiler while profiling is on
+        self.profiler = None
+        self._profiler = None
+        if profile:
+            self.enable_profiling()
 
     def _print_state(self):
 
-        state = self._next_state()
+        state = self._state
         for i in range(self.n_channels):
             print(state[:, :, i])
         # time.sleep(2)
 
     def _next_state(self):
-        state = np.zeros(shape=self.shape, dtype=np.int8)
+        # the observation buffer is patched in place, hand out a snapshot of it
+        if self.observation_mode == "tensor":
+            return self._state.copy()
+        if self.observation_mode == "packed":
+            return self._packed.copy()
+        return encoding.encode_entities(
+            self.agents, self.bins, self.staging_in, self.staging_out, self.compiled_layout
+        )
+
+    def _build_static_state(self):
+        # Blocked Positions, read-only and possibly shared with other processes
+        return self.compiled_layout.static_state
 
-        # Blocked Positions
-        for pos in self.blocked_positions:
-            state[pos[0], pos[1], 0] = 1
+    def _build_state(self):
+        state = self._static_state.copy()
 
-        # Agent Position and Slot
-        state[self.agent.agent_pos[0], self.agent.agent_pos[1], 1] = 1
+        for agent in self.agents:
+            # Agent Position and Slot
+            state[agent.agent_pos[0], agent.agent_pos[1], 1] = 1
 
-        # Agent Position and Slot
-        if self.agent.loaded_item:
-            state[
-                self.agent.agent_pos[0],
-                self.agent.agent_pos[1],
-                1 + self.agent.loaded_item.slot,
-            ] = 1
+            # Agent Position and Slot
+            if agent.loaded_item:
+                state[
+                    agent.agent_pos[0], agent.agent_pos[1], 1 + agent.loaded_item.slot,
+                ] = 1
 
         # Bin Layers
         for b in self.bins:
@@ -128,6 +238,12 @@ class WarehouseEnv(gym.Env):
                     for p in b.loading_positions:
                         state[p[0], p[1], self.max_items_in_env + 1 + item.slot] = -1
 
+        # Full Bins
+        for b in self.bins:
+            if not b.has_capacity():
+                for p in b.loading_positions:
+                    state[p[0], p[1], self.compiled_layout.full_channel] = 1
+
         # Staging In
         for slot in self.staging_in.get_slots().keys():
             for p in self.staging_in.loading_positions:
@@ -140,38 +256,157 @@ class WarehouseEnv(gym.Env):
 
         return state
 
-    def reset(self, assertions=True):
+    def _set_state(self, state):
+        self._state = state
+        if self.observation_mode == "packed":
+            self._packed = encoding.encode_packed(state)
+        self._contents[:] = False
+        for i, b in enumerate(self.bins + [self.staging_in]):
+            self._contents[i, list(b.get_used_slot_ids())] = True
+        staging_out = self.compiled_layout.staging_out
+        self._contents[staging_out, self.staging_out.incoming] = True
+        for i, b in enumerate(self.bins):
+            self._free_capacity[i] = b.capacity - len(b.get_slots())
+        self._bin_slots = [tuple(b.get_slots()) for b in self.bins]
+
+    def _write(self, pos, channel, value):
+        self._state[pos[0], pos[1], channel] = value
+        if self.observation_mode == "packed":
+            # keep the bit planes in sync instead of packing the whole tensor per step
+            encoding.write_packed(self._packed, pos, channel, value)
+
+    def _patch_agent(self, pos, item, value):
+        self._write(pos, 1, value)
+        if item is not None:
+            self._write(pos, 1 + item.slot, value)
+
+    def _patch_slot(self, container, slot):
+        # recomputes a single slot layer at the loading positions of one bin/staging area
+        if container is self.staging_out:
+            present = slot in self.staging_out.incoming
+            value = -1 if present else 0
+        else:
+            present = slot in container.get_used_slot_ids()
+            value = 1 if present else 0
+            if container is not self.staging_in and slot in self._put_slots:
+                value = -1
+        index = self._container_index[container.pos]
+        self._contents[index, slot] = present
+
+        for p in container.loading_positions:
+            self._write(p, self.max_items_in_env + 1 + slot, value)
+
+        if index < len(self.bins):
+            self._bin_slots[index] = tuple(container.get_slots())
+            free = container.capacity - len(container.get_slots())
+            if (free == 0) != (self._free_capacity[index] == 0):
+                for p in container.loading_positions:
+                    self._write(p, self.compiled_layout.full_channel, int(free == 0))
+            self._free_capacity[index] = free
+
+    def _container_at(self, pos):
+        index = self.compiled_layout.loading_index[pos[0], pos[1]]
+        return self.containers[index] if index != NO_CONTAINER else None
+
+    def reset(self, assertions=True, return_info=False):
         # Reset the state of the environment to an initial state
 
-        print("Reset called - Invalid Actions: " + str(self.invalid_action_counter))
+        if self.verbose:
+            print("Reset called - Invalid Actions: " + str(self.invalid_action_counter))
         self.invalid_action_counter = 0
         self.staging_in.put_transaction = None
         self.staging_out.pick_transaction = None
 
         if assertions:
-            assert (
-                self.agent.loaded_item is None
-            ), "New Transaction can only be generated if agent has no item"
+            for agent in self.agents:
+                assert (
+                    agent.loaded_item is None
+                ), "New Transaction can only be generated if agent has no item"
             assert len(self.staging_in.get_slots()) == 0
             assert len(self.staging_out.incoming) == 0
         else:
-            self.agent.loaded_item = None
+            for agent in self.agents:
+                agent.loaded_item = None
             self.staging_in._slots = {}
             self.staging_out.incoming = []
 
-        self.transaction = create_new_transaction(
-            self.max_items_in_env, self.layout["bin-slot-size"], self.bins
-        )
+        if self._profiler is None:
+            self.transaction = self.transaction_source.next(self.inventory)
+        else:
+            self.transaction = self._profiler.call(
+                "transaction", self.transaction_source.next, self.inventory
+            )
         if self.transaction.get_type() == PICK_T:
             self.staging_out.apply_pick(self.transaction)
+            self._put_slots = set()
         elif self.transaction.get_type() == PUT_T:
             self.staging_in.apply_put(self.transaction)
+            self._put_slots = {item.slot for item in self.transaction.items}
         else:
             raise AssertionError("Transaction must be either pick or put transaction.")
+
+        # a new transaction touches every layer, so this is the only full rebuild
+        self._set_state(self._build_state())
+        if return_info:
+            return self._next_state(), {"action_mask": self.action_mask()}
         return self._next_state()
 
     def step(self, action):
-        state = self._next_state()
+        profiler = self._profiler
+        if profiler is None:
+            reward, done = self._step(action)
+            next_state = self._next_state()
+            info = self._info(done)
+        else:
+            reward, done = profiler.call("step", self._step, action)
+            next_state = profiler.call("next_state", self._next_state)
+            info = profiler.call("info", self._info, done)
+        # self._print_state()
+        if self.debug_checks:
+            self._check_observation(next_state)
+        return next_state, reward, done, info
+
+    def step_many(self, actions, stop_on_invalid=False, per_step_rewards=False):
+        """Executes a sequence of actions and returns (observation, reward, done, info) after it.
+
+        Only the final observation is built. Stops early when the episode is done or,
+        with stop_on_invalid, after the first action with a negative reward. reward
+        is the summed reward, with per_step_rewards an array of the reward of every
+        executed action. info["steps"] is the number of executed actions.
+        """
+        profiler = self._profiler
+        rewards = []
+        done = False
+        for action in actions:
+            if profiler is None:
+                reward, done = self._step(action)
+            else:
+                reward, done = profiler.call("step", self._step, action)
+            rewards.append(reward)
+            if done or (stop_on_invalid and reward < 0):
+                break
+        if profiler is None:
+            next_state = self._next_state()
+            info = self._info(done)
+        else:
+            next_state = profiler.call("next_state", self._next_state)
+            info = profiler.call("info", self._info, done)
+        if self.debug_checks:
+            self._check_observation(next_state)
+        info["steps"] = len(rewards)
+        if per_step_rewards:
+            return next_state, np.array(rewards, dtype=np.float32), done, info
+        return next_state, float(sum(rewards)), done, info
+
+    def _step(self, action):
+        # one time step without building the observation, returns (reward, done)
+        if self.debug_checks:
+            state = self._state.copy()
+            mask = self.action_mask()
+        profiler = self._profiler
+        pos = self.agent.agent_pos
+        item = self.agent.loaded_item
+
         # Execute one time step within the environment
         if (
             action == MOVE_UP
@@ -179,33 +414,271 @@ class WarehouseEnv(gym.Env):
             or action == MOVE_LEFT
             or action == MOVE_RIGHT
         ):
-            reward = self.agent.move(action)
-        elif action >= self.load_actions[0] and action <= self.load_actions[-1]:
-            reward = self.agent.load_item(
-                self.bins,
-                self.staging_in,
-                self.staging_out,
-                slot=(action - self.load_actions[0] + 1),
-            )
+            if profiler is None:
+                reward = self.agent.move(action)
+            else:
+                reward = profiler.call("move", self.agent.move, action)
+            if reward >= 0:
+                self._patch_agent(pos, item, 0)
+                self._patch_agent(self.agent.agent_pos, item, 1)
+        else:
+            reward = self._apply_item_action(self.agent, action)
+        if reward < 0:
+            self.invalid_action_counter += 1
+        if self.debug_checks:
+            assert mask[action] == (reward >= 0)
+            if reward < 0:
+                assert np.array_equal(state, self._state)
+        if profiler is None:
+            return reward, self._is_episode_done()
+        return reward, profiler.call("is_episode_done", self._is_episode_done)
+
+    def _info(self, done):
+        return {"action_mask": self.action_mask()}
+
+    def _check_observation(self, next_state):
+        assert np.array_equal(self._state, self._build_state())
+        assert np.array_equal(
+            self._state,
+            encoding.expand_observation(
+                next_state, self.observation_mode, self.compiled_layout
+            ),
+        )
+
+    def action_mask(self, agent=None):
+        """Boolean mask over all actions, False for the ones step would answer with INVALID_ACTION.
+
+        Moves come from the precomputed move_mask of the layout, loads and unloads
+        from the contents of the bin or staging area the agent stands at.
+        """
+        agent = agent or self.agent
+        r, c = agent.agent_pos
+        mask = self._move_rows[self._move_code.item(r, c)].copy()
+        index = self.compiled_layout.loading_index.item(r, c)
+        if index == NO_CONTAINER:
+            return mask
+        staging_out = self.compiled_layout.staging_out
+        if agent.loaded_item is None:
+            if index != staging_out:
+                mask[4 : 4 + self.max_items_in_env] = self._contents[index, 1:]
+        else:
+            # only the carried item can be unloaded, to a bin with free capacity or to
+            # staging out if it is incoming
+            slot = agent.loaded_item.slot
+            n_bins = self.compiled_layout.n_bins
+            if (index < n_bins and self._free_capacity[index] > 0) or (
+                index == staging_out and self._contents[index, slot]
+            ):
+                mask[self.unload_actions[slot - 1]] = True
+        return mask
+
+    def bins_with_capacity(self):
+        """Indices of the bins that can take another item"""
+        return np.flatnonzero(self._free_capacity > 0)
+
+    def enable_profiling(self, cprofile=False, hook=None) -> StepProfiler:
+        """Times every phase of a step from now on, stats() returns the counters.
+
+        Each phase costs a single `is None` check while profiling is off. See
+        StepProfiler for the phases, the cprofile option and hook(phase, ns).
+        """
+        if self.profiler is None:
+            self.profiler = StepProfiler(cprofile=cprofile, hook=hook)
+        self._profiler = self.profiler
+        return self.profiler
+
+    def disable_profiling(self):
+        # the counters are kept, stats() still returns them
+        self._profiler = None
+
+    def stats(self):
+        """Snapshot of the profiling counters per phase, {} if it was never enabled"""
+        if self.profiler is None:
+            return {}
+        stats = self.profiler.stats()
+        stats["enabled"] = self._profiler is not None
+        return stats
+
+    def _apply_item_action(self, agent, action):
+        pos = agent.agent_pos
+        item = agent.loaded_item
+        if action >= self.load_actions[0] and action <= self.load_actions[-1]:
+            slot = action - self.load_actions[0] + 1
+            containers = (self.bins, self.staging_in, self.staging_out)
+            if self._profiler is None:
+                reward = agent.load_item(*containers, slot=slot)
+            else:
+                reward = self._profiler.call(
+                    "load_item", agent.load_item, *containers, slot=slot
+                )
+            if reward >= 0:
+                self._patch_agent(pos, agent.loaded_item, 1)
+                self._patch_slot(self._container_at(pos), slot)
         elif action >= self.unload_actions[0] and action <= self.unload_actions[-1]:
-            reward = self.agent.unload_item(
-                self.bins,
-                self.staging_in,
-                self.staging_out,
-                slot=(action - self.unload_actions[0] + 1),
-            )
+            slot = action - self.unload_actions[0] + 1
+            containers = (self.bins, self.staging_in, self.staging_out)
+            if self._profiler is None:
+                reward = agent.unload_item(*containers, slot=slot)
+            else:
+                reward = self._profiler.call(
+                    "unload_item", agent.unload_item, *containers, slot=slot
+                )
+            if reward >= 0:
+                self._patch_agent(pos, item, 0)
+                self._patch_agent(pos, None, 1)
+                self._patch_slot(self._container_at(pos), slot)
         else:
             raise AssertionError("Invalid action Type.")
+        return reward
+
+    def seed(self, seed=None):
+        self.transaction_source.seed(seed)
+        return [seed]
+
+    def get_state(self, full=True) -> WarehouseState:
+        """Immutable, hashable snapshot of the environment for set_state, e.g. to branch in a search.
+
+        With full=False the transaction source state and the counters are left out, equal warehouse
+        situations then give equal snapshots and set_state keeps the current ones. Bin
+        contents are kept as tuples while stepping, a snapshot copies O(bins) references.
+        """
+        transaction = None
+        placed = removed = ()
+        if self.transaction is not None and self.transaction.get_type() == PICK_T:
+            slot_ids = tuple(self.transaction.slot_ids)
+            transaction = (PICK_T, slot_ids)
+            live = [self._live_item(slot) for slot in slot_ids]
+            removed = tuple(
+                item.slot
+                for item in live
+                if item is not None and item.had_first_remove_from_bin_reward
+            )
+        elif self.transaction is not None:
+            items = self.transaction.items
+            transaction = (PUT_T, tuple(item.slot for item in items))
+            placed = tuple(
+                item.slot for item in items if item.had_first_place_in_bin_reward
+            )
 
-        next_state = self._next_state()
-        done = self._is_episode_done()
-        # self._print_state()
-        if reward < 0:
-            self.invalid_action_counter += 1
-            assert np.array_equal(state, next_state)
-        return next_state, reward, done, {}
+        return WarehouseState(
+            tuple(
+                (
+                    a.agent_pos[0],
+                    a.agent_pos[1],
+                    a.loaded_item.slot if a.loaded_item is not None else 0,
+                )
+                for a in self.agents
+            ),
+            tuple(self._bin_slots),
+            tuple(self.staging_in.get_slots()),
+            tuple(self.staging_out.incoming),
+            transaction,
+            placed,
+            removed,
+            (self.item_counter, self.invalid_action_counter) if full else None,
+            self.transaction_source.get_state() if full else None,
+        )
 
-    def render(self, mode="human", close=False):
+    def set_state(self, state: WarehouseState, observe=True):
+        """Restores a get_state snapshot, returns its observation or None if not observe.
+
+        Only the bins whose contents differ are rewritten, the inventory is updated for
+        their slot ids and only the observation layers that differ are patched, so the
+        cost grows with the difference to the current state and the number of bins to
+        compare. Copying the observation is the bulk of the time on large layouts in
+        tensor mode, observe=False skips it.
+        """
+        items = self._items
+        for agent in self.agents:
+            self._patch_agent(agent.agent_pos, agent.loaded_item, 0)
+
+        # get_state shares the cached tuples, so unchanged bins mostly hold the same
+        # tuple object as the snapshot and only the others are compared
+        bin_slots = self._bin_slots
+        candidates = itertools.compress(
+            range(len(bin_slots)), map(operator.is_not, bin_slots, state.bins)
+        )
+        changed = [i for i in candidates if bin_slots[i] != state.bins[i]]
+        old_slots = {i: bin_slots[i] for i in changed}
+        # release first, a slot id can move from one changed bin to another
+        for i in changed:
+            for slot in old_slots[i]:
+                self.inventory.release(slot)
+        for i in changed:
+            b = self.bins[i]
+            b._slots = {}
+            for slot in state.bins[i]:
+                b.place_item(items[slot], slot)
+        old_staging_in = tuple(self.staging_in.get_slots())
+        if old_staging_in != state.staging_in:
+            self.staging_in._slots = {slot: items[slot] for slot in state.staging_in}
+        old_put = self._put_slots
+        old_incoming = set(self.staging_out.incoming)
+        self.staging_out.incoming = list(state.incoming)
+        for agent, (r, c, slot) in zip(self.agents, state.agents):
+            agent.agent_pos = (r, c)
+            loaded = agent.loaded_item.slot if agent.loaded_item is not None else 0
+            if slot != loaded:
+                agent.loaded_item = items[slot] if slot else None
+
+        self.staging_in.put_transaction = None
+        self.staging_out.pick_transaction = None
+        self._put_slots = set()
+        if state.transaction is None:
+            self.transaction = None
+        elif state.transaction[0] == PICK_T:
+            self.transaction = PickTransaction(list(state.transaction[1]))
+            self.staging_out.pick_transaction = self.transaction
+            removed = set(state.removed)
+            for slot in state.transaction[1]:
+                item = self._live_item(slot)
+                if item is not None:
+                    item.had_first_remove_from_bin_reward = slot in removed
+        else:
+            # put items are always in staging in, a bin or carried
+            put_items = [self._live_item(slot) for slot in state.transaction[1]]
+            placed = set(state.placed)
+            for item in put_items:
+                item.had_first_place_in_bin_reward = item.slot in placed
+            self.transaction = PutTransaction(put_items)
+            self.staging_in.put_transaction = self.transaction
+            self._put_slots = set(state.transaction[1])
+        if state.counters is not None:
+            self.item_counter, self.invalid_action_counter = state.counters
+        if state.rng is not None:
+            self.transaction_source.set_state(state.rng)
+
+        for agent in self.agents:
+            self._patch_agent(agent.agent_pos, agent.loaded_item, 1)
+        for i in changed:
+            for slot in set(old_slots[i]) ^ set(state.bins[i]):
+                self._patch_slot(self.bins[i], slot)
+            # a reordered bin has no slot to patch
+            self._bin_slots[i] = state.bins[i]
+        for slot in set(old_staging_in) ^ set(state.staging_in):
+            self._patch_slot(self.staging_in, slot)
+        for slot in old_put ^ self._put_slots:
+            for b in self.bins:
+                self._patch_slot(b, slot)
+        for slot in old_incoming ^ set(state.incoming):
+            self._patch_slot(self.staging_out, slot)
+
+        if self.debug_checks:
+            assert np.array_equal(self._state, self._build_state())
+            assert self._bin_slots == [tuple(b.get_slots()) for b in self.bins]
+        return self._next_state() if observe else None
+
+    def _live_item(self, slot):
+        # the Item of a slot id in a bin, staging in or carried, None if it is elsewhere
+        b = self.inventory.bin_of(slot)
+        if b is not None:
+            return b.get_slots()[slot]
+        for agent in self.agents:
+            if agent.loaded_item is not None and agent.loaded_item.slot == slot:
+                return agent.loaded_item
+        return self.staging_in.get_slots().get(slot)
+
+    def render(self, mode=None, close=False):
         # Render the environment to the screen
         # print(self.item_counter)
         # for b in self.bins:
@@ -213,14 +686,83 @@ class WarehouseEnv(gym.Env):
         # print(self.agent.to_string())
         # print(self.staging_in.to_string())
         # print(self.staging_out.to_string())
+        if close:
+            self.close()
+            return None
+
+        mode = mode or self.render_mode or "human"
+        assert mode in self.metadata["render.modes"]
+        if self._profiler is not None:
+            return self._profiler.call("render", self._render, mode)
+        return self._render(mode)
+
+    def _render(self, mode):
+        if self.render_worker is not None and mode == "human":
+            self._submit_frame()
+            return None
+
+        if self.gui is None:
+            self.gui = self._create_gui(offscreen=(mode == "rgb_array"))
+
+        frame = self.gui.frame_step(
+            self.agents,
+            self.bins,
+            self.staging_in,
+            self.staging_out,
+            self.transaction,
+            return_frame=(mode == "rgb_array"),
+        )
+        if mode == "rgb_array":
+            # surfarray is indexed [x, y], gym expects [height, width, rgb]
+            return np.transpose(frame, (1, 0, 2))
+        return None
+
+    def close(self):
+        if self.gui is not None:
+            self.gui.close()
+            self.gui = None
+        if self._worker is not None:
+            self._worker.close()
+            self._worker = None
+
+    def _submit_frame(self):
+        from warehouse_env.vis import make_frame
+        from warehouse_env.render_worker import RenderWorker
+
+        if self._worker is None:
+            self._worker = RenderWorker(
+                [self.layout["height"], self.layout["width"]],
+                self.max_items_in_env,
+                use_process=(self.render_worker == "process"),
+                max_fps=self.render_fps,
+            )
+        self._worker.submit(
+            make_frame(
+                self.agents,
+                self.bins,
+                self.staging_in,
+                self.staging_out,
+                self.transaction,
+            )
+        )
+
+    def _create_gui(self, offscreen):
+        # pygame is only imported once rendering is requested
+        from warehouse_env.vis import WarehouseGui
+
+        return WarehouseGui(
+            [self.layout["height"], self.layout["width"]],
+            self.max_items_in_env,
+            offscreen=offscreen,
+        )
 
-        self.gui.frame_step(self.agent, self.bins, self.staging_in, self.staging_out, self.transaction)
-        pass
+    def _agent_starts(self):
+        return [self.layout["agent-start"]["position"]]
 
     def _create_bins(self, bin_config, bin_size):
         bins = []
         for b in bin_config:
-            bins.append(Bin(b["position"], b["loading"]))
+            bins.append(Bin(b["position"], b["loading"], self.inventory, bin_size))
         return bins
 
     def _is_episode_done(self):
@@ -228,7 +770,7 @@ class WarehouseEnv(gym.Env):
             done = self.staging_out.is_current_transaction_done()
             count = len(self.transaction.slot_ids)
         elif self.transaction.get_type() == PUT_T:
-            done = self.staging_in.is_current_transaction_done(self.bins)
+            done = self.staging_in.is_current_transaction_done(self.inventory)
             count = len(self.transaction.items)
         else:
             raise AssertionError("Transaction must be either pick or put transaction.")